@@ -1,45 +1,174 @@
 import os
+import click
+import mimetypes
 import frontmatter
 from flask import Flask, render_template, abort, request, redirect, url_for, session, Response
-from flask import send_file
-from flask import make_response
+from flask import make_response, send_from_directory
 from functools import wraps
-from markdown import markdown
 import re
 import unicodedata
+import hashlib
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
 from datetime import datetime, timedelta
-import zipfile
-import json
-import glob
+from email.utils import format_datetime
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
+from post_index import PostIndex
+from content_store import create_content_store
+from search_index import SearchIndex
+from render_cache import RenderCache
+from visit_counter import VisitCounter
+from stats_store import create_store, iter_export
+from settings import ConfigStore
+from comments_service.comment_store import CommentStore
+from comments_service.metrics import Metrics, bearer_token_matches
+from freeze import Freezer, FREEZE_ENVIRON_KEY
+from backup import BackupManager, MODES as BACKUP_MODES
+from feed import FeedCache, rfc822_date
+from page_cache import create_page_cache, normalize_args
+from uploads import UploadStore, upload_name_re
+from assets import AssetManifest, IMMUTABLE_CACHE
+from compression import ResponseCompressor
+from preview import BlockRenderer
+from related import RelatedPosts
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-STATS_FILE = os.path.join(BASE_DIR, 'stats.json')
-COMMENTS_DATA_DIR = 'comments_data/'
 load_dotenv() # Esto carga las variables de tu archivo .env
-
-app = Flask(__name__)
+STATS_FILE = os.environ.get('STATS_FILE', os.path.join(BASE_DIR, 'stats.json'))
+COMMENTS_DATA_DIR = os.environ.get('COMMENTS_DATA_DIR', 'comments_data/')
+comment_store = CommentStore(COMMENTS_DATA_DIR)
+
+# Backend de estadísticas: 'sqlite' (por defecto) o 'json' (stats.json de siempre)
+STATS_BACKEND = os.environ.get('STATS_BACKEND', 'sqlite')
+STATS_DB = os.environ.get('STATS_DB', os.path.join(BASE_DIR, 'stats.db'))
+stats_store = create_store(STATS_BACKEND, STATS_FILE, STATS_DB)
+visit_counter = VisitCounter(stats_store)
+TRUST_PROXY = os.environ.get('TRUST_PROXY', '0') == '1'
+
+app = Flask(__name__, static_folder=os.environ.get('STATIC_DIR', 'static'))
 app.secret_key = os.environ.get('SECRET_KEY', 'default-key-for-dev')
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin')
 
+# Dónde viven los posts: 'files' (content/<slug>.md), 'sharded' (content/ab/<slug>.md)
+# o 'sqlite' (un único CONTENT_DB). Ver content_store.py para importar/exportar.
 CONTENT_DIR = "content"
+CONTENT_BACKEND = os.environ.get('CONTENT_BACKEND', 'files')
+CONTENT_DB = os.environ.get('CONTENT_DB', os.path.join(CONTENT_DIR, 'content.db'))
+content_store = create_content_store(CONTENT_BACKEND, CONTENT_DIR, CONTENT_DB)
+post_index = PostIndex(content_store)
+search_index = SearchIndex()
+post_index.subscribe(search_index.on_post_changed)
+# "Posts relacionados" (TF-IDF), recalculados en segundo plano cuando cambia un post
+related_posts = RelatedPosts(post_index, top_k=int(os.environ.get('RELATED_POSTS', 5)))
+post_index.subscribe(related_posts.on_post_changed)
+render_cache = RenderCache(max_entries=int(os.environ.get('RENDER_CACHE_SIZE', 256)),
+                           spill_dir=os.environ.get('RENDER_CACHE_DIR') or None)
+
+# Ajustes del sitio (config.json + entorno), releídos sólo cuando el archivo cambia
+CONFIG_FILE = os.environ.get('CONFIG_FILE', 'config.json')
+config_store = ConfigStore(CONFIG_FILE)
+
+# Cache del listado: 'memory' (LRU por worker) o 'sqlite' (compartida entre workers)
+PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+PAGE_CACHE_DB = os.environ.get('PAGE_CACHE_DB', os.path.join(BASE_DIR, 'page_cache.db'))
+page_cache = create_page_cache(post_index, PAGE_CACHE_BACKEND, PAGE_CACHE_DB,
+                               max_entries=int(os.environ.get('PAGE_CACHE_SIZE', 256)))
 
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp3', 'mp4'}
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+upload_store = UploadStore(UPLOAD_FOLDER)
+UPLOAD_NAME_RE = upload_name_re(ALLOWED_EXTENSIONS)
+
+# CSS/imágenes del tema con el hash en el nombre: {{ asset_url('style.css') }}
+asset_manifest = AssetManifest(app.static_folder)
+asset_manifest.build()
+app.jinja_env.globals['asset_url'] = asset_manifest.url
+
+# HTML/RSS/JSON comprimidos con gzip (o brotli) a partir de COMPRESS_MIN_SIZE bytes
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', '1') == '1'
+compressor = ResponseCompressor(min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 1024)),
+                                max_entries=int(os.environ.get('COMPRESS_CACHE_SIZE', 256)))
+
+# Las plantillas sólo cambian con un despliegue: entran en el ETag de los posts
+def templates_version():
+    folder = os.path.join(app.root_path, app.template_folder)
+    stamps = sorted((name, os.stat(os.path.join(folder, name)).st_mtime_ns) for name in os.listdir(folder))
+    return hashlib.sha1(repr(stamps).encode('utf-8')).hexdigest()[:12]
+
+TEMPLATES_VERSION = templates_version()
+
+# Preview del editor: sólo se convierten los bloques que cambiaron desde la última tecla
+preview_renderer = BlockRenderer(max_entries=int(os.environ.get('PREVIEW_CACHE_SIZE', 4096)))
+
+# Sitio estático para nginx (flask --app app freeze). Con FREEZE_ON_SAVE=1 se
+# regenera en segundo plano cada vez que el admin guarda o borra un post.
+STATIC_OUTPUT_DIR = os.environ.get('STATIC_OUTPUT_DIR', os.path.join(BASE_DIR, '_site'))
+FREEZE_ON_SAVE = os.environ.get('FREEZE_ON_SAVE') == '1'
+freezer = Freezer(app, post_index, STATIC_OUTPUT_DIR,
+                  per_page=lambda: config_store.get().per_page,
+                  base_url=lambda: config_store.get().site_url or 'http://localhost/',
+                  page_settings=lambda: config_store.get().digest,
+                  post_extras=lambda slug: [(e.slug, e.stamp) for e in related_entries(slug)])
+if FREEZE_ON_SAVE:
+    # Los relacionados se recalculan unos segundos después de guardar
+    related_posts.subscribe(lambda slugs: freezer.schedule())
+
+# RSS: últimos RSS_ITEMS posts, cacheado hasta que cambie algún post
+RSS_ITEMS = int(os.environ.get('RSS_ITEMS', 20))
+RSS_FULL_CONTENT = os.environ.get('RSS_FULL_CONTENT') == '1'
+feed_cache = FeedCache(post_index)
+
+# Manifiestos de los backups anteriores (base de los incrementales/diferenciales)
+BACKUP_STATE_DIR = os.environ.get('BACKUP_STATE_DIR', os.path.join(BASE_DIR, 'backups'))
+# Con CONTENT_BACKEND=sqlite va al zip una copia consistente de content.db, no el archivo en uso
+backup_manager = BackupManager([(CONTENT_DIR, ''), (UPLOAD_FOLDER, 'uploads')], BACKUP_STATE_DIR,
+                               databases=[(CONTENT_DB, 'content.db')] if CONTENT_BACKEND == 'sqlite' else [])
+
+# /metrics (Prometheus) y profiler por petición con la cabecera X-Profile (sólo admin).
+# Con varios workers, METRICS_DIR junta los números de todos (ver gunicorn.conf.py).
+metrics = Metrics(os.environ.get('METRICS_DIR') or None)
+metrics.instrument(app, 'neocms', can_profile=lambda: bool(session.get('logged_in')),
+                   can_scrape=bearer_token_matches(os.environ.get('METRICS_TOKEN')))
+
+@metrics.collector
+def hot_path_counters():
+    render = render_cache.stats()
+    pages = page_cache.stats()
+    return [
+        ('neocms_frontmatter_parses_total', 'Posts parseados (frontmatter + YAML)', {}, post_index.parses),
+        ('neocms_markdown_renders_total', 'Posts convertidos de Markdown a HTML', {}, render['misses']),
+        ('neocms_render_cache_hits_total', 'HTML de posts servido desde la cache', {'source': 'memory'}, render['hits']),
+        ('neocms_render_cache_hits_total', 'HTML de posts servido desde la cache', {'source': 'disk'}, render['disk_hits']),
+        ('neocms_page_cache_hits_total', 'Listados servidos desde la cache', {}, pages['hits'] + pages['shared_hits']),
+        ('neocms_page_cache_misses_total', 'Listados renderizados', {}, pages['misses']),
+        ('neocms_compress_cache_hits_total', 'Respuestas comprimidas servidas desde la cache', {}, compressor.hits),
+        ('neocms_compressions_total', 'Respuestas comprimidas con gzip/brotli', {}, compressor.misses),
+        ('neocms_stats_reads_total', 'Lecturas del almacén de estadísticas', {'backend': STATS_BACKEND}, stats_store.reads),
+        ('neocms_stats_writes_total', 'Escrituras del almacén de estadísticas', {'backend': STATS_BACKEND}, stats_store.writes),
+        ('neocms_comment_store_reads_total', 'Consultas a comments.db', {}, comment_store.reads),
+        ('neocms_comment_store_writes_total', 'Transacciones de escritura en comments.db', {}, comment_store.writes),
+    ]
+
+def content_changed():
+    # Se llama cada vez que cambia algo que se ve en las páginas públicas
+    page_cache.bump()
+    if FREEZE_ON_SAVE:
+        freezer.schedule()
+
+@app.context_processor
+def inject_settings():
+    return {'settings': config_store.get()}
+
+def related_entries(slug):
+    # Posts relacionados ya publicados (los que ve post.html)
+    return [e for e in map(post_index.lookup, related_posts.get(slug)) if e is not None and not e.is_draft]
 
 def get_posts():
-    posts = []
-    for filename in os.listdir(CONTENT_DIR):
-        if filename.endswith(".md"):
-            path = os.path.join(CONTENT_DIR, filename)
-            post = frontmatter.load(path)
-            # Guardamos el slug (nombre del archivo sin .md) para la URL
-            post.metadata['slug'] = filename[:-3]
-            posts.append(post.metadata)
-    return sorted(posts, key=lambda x: x.get('date', ''), reverse=True)
+    # Metadatos de todos los posts (borradores incluidos) desde el índice en memoria
+    return [entry.metadata for entry in post_index.entries()]
 
 def slugify(text):
     text = text.lower()
@@ -57,44 +186,27 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def client_ip():
+    # Detrás de un proxy (nginx) la IP real viene en X-Forwarded-For
+    if TRUST_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or ''
+
 def log_visit(path='home'):
-    # Si es admin, no contamos la visita
-    if request.cookies.get('is_admin'):
+    # Si es admin (sesión firmada, no una cookie que cualquiera puede poner) o
+    # es el freeze generando el sitio estático, no contamos la visita
+    if session.get('logged_in') or request.environ.get(FREEZE_ENVIRON_KEY):
         return
 
-    # Estructura base
-    stats = {'daily': {}, 'posts': {}, 'total': 0}
-    
-    # Intentamos leer. Si falla, NO reseteamos inmediatamente, intentamos recuperar.
-    if os.path.exists(STATS_FILE) and os.path.getsize(STATS_FILE) > 0:
-        try:
-            with open(STATS_FILE, 'r') as f:
-                stats = json.load(f)
-        except json.JSONDecodeError:
-            print("Error: stats.json corrupto. Se iniciará uno nuevo pero verifica backups.")
-            # Aquí podrías guardar una copia del corrupto si quisieras forense
-            pass
-
-    today = datetime.now().strftime('%Y-%m-%d')
-    
-    # Aseguramos que existan las claves (por si viene de una versión vieja)
-    stats.setdefault('daily', {})
-    stats.setdefault('posts', {})
-    stats.setdefault('total', 0)
-
-    # INCREMENTOS
-    stats['total'] += 1
-    stats['daily'][today] = stats['daily'].get(today, 0) + 1
-    
-    if path != 'home':
-        stats['posts'][path] = stats['posts'].get(path, 0) + 1
-    
-    # Guardado atómico (más seguro)
-    try:
-        with open(STATS_FILE, 'w') as f:
-            json.dump(stats, f, indent=4)
-    except Exception as e:
-        print(f"Error guardando estadísticas: {e}")
+    # Visitante = hash de IP + navegador (sólo entra a un HyperLogLog, no se guarda)
+    user_agent = request.user_agent.string[:200]
+    visitor = hashlib.sha1(f"{app.secret_key}|{client_ip()}|{user_agent}".encode('utf-8')).hexdigest()
+    referrer = urlsplit(request.referrer or '').netloc.lower()
+    if referrer == request.host.lower():
+        referrer = ''
+
+    # Sólo sumamos en memoria; un hilo de fondo vuelca los incrementos a stats.json
+    visit_counter.hit(path, visitor=visitor, referrer=referrer, user_agent=user_agent)
 
 # Asegúrate de que Flask sepa qué tema cargar al inicio
 @app.before_request
@@ -104,19 +216,47 @@ def load_theme():
         # el CSS ya maneja la clase 'dark-mode'
         pass
 
+@app.after_request
+def compress_response(response):
+    if COMPRESS_RESPONSES:
+        return compressor.apply(request, response)
+    return response
+
+@app.after_request
+def cache_uploads(response):
+    # Las subidas se guardan por su sha256: una URL nunca cambia de contenido
+    if request.path.startswith('/static/uploads/') and response.status_code == 200:
+        name = request.path.rsplit('/', 1)[-1]
+        if UPLOAD_NAME_RE.match(re.sub(r'-\d+w(?=\.)', '', name)):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    return response
+
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    resolved = asset_manifest.resolve(filename)
+    if resolved is None:
+        abort(404)
+    rel_path, current = resolved
+
+    compressed = asset_manifest.precompressed(rel_path, request.accept_encodings)
+    if compressed:
+        encoding, served_path = compressed
+        response = send_from_directory(app.static_folder, served_path,
+                                       mimetype=mimetypes.guess_type(rel_path)[0])
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(app.static_folder, rel_path)
+    response.vary.add('Accept-Encoding')
+    # Un hash viejo (HTML cacheado de antes de un deploy) recibe el archivo actual, pero sin immutable
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE if current else 'public, max-age=300'
+    return response
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         if request.form.get('password') == os.environ.get('ADMIN_PASSWORD'):
             session['logged_in'] = True
-            # 1. Creamos la respuesta primero
-            resp = make_response(redirect(url_for('admin_list')))
-
-            # 2. Le asignamos la cookie en una línea separada
-            resp.set_cookie('is_admin', 'true', max_age=30*24*60*60)
-
-            # 3. Retornamos el objeto de respuesta completo
-            return resp
+            return redirect(url_for('admin_list'))
 
     return render_template('login.html')
 
@@ -129,59 +269,31 @@ def logout():
 @app.route('/')
 def index():
     log_visit() # Registramos la visita al cargar el home
-    query = request.args.get('q', '').lower()
-    tag_filter = request.args.get('tag', '').lower()
-    cat_filter = request.args.get('category', '').lower()
-
-    # Parámetro de paginación
-    page = request.args.get('page', 1, type=int)
-    per_page = 8
 
-    all_posts = []
-    categories_count = {}
-    tags_set = set()
-
-    if not os.path.exists(CONTENT_DIR): os.makedirs(CONTENT_DIR)
+    # El HTML sólo cambia cuando cambia el contenido: se cachea por parámetros normalizados
+    settings = config_store.get()
+    key = normalize_args(request.args) + (bool(session.get('logged_in')), settings.digest)
+    return page_cache.get(key, lambda: render_index(*key[:4], per_page=settings.per_page))
+
+def render_index(query, tag_filter, cat_filter, page, per_page):
+
+    # Con búsqueda, el orden lo da la relevancia (BM25); sin ella, la fecha
+    if query:
+        post_index.refresh()
+        candidates = [post_index.lookup(slug) for slug in search_index.search(query)]
+        candidates = [e for e in candidates if e is not None and not e.is_draft]
+        if tag_filter:
+            candidates = [e for e in candidates if tag_filter in e.metadata['tags_list']]
+        if cat_filter:
+            candidates = [e for e in candidates if cat_filter == str(e.category).lower()]
+    else:
+        candidates = post_index.filtered(tag_filter, cat_filter)
 
-    for filename in os.listdir(CONTENT_DIR):
-        if filename.startswith("draft_"):
-            continue
-        if filename.endswith(".md"):
-            p_file = frontmatter.load(os.path.join(CONTENT_DIR, filename))
-            metadata = p_file.metadata
-            metadata['slug'] = filename[:-3]
-
-            # Cálculo de tiempo de lectura (200 palabras por minuto)
-            words = len(p_file.content.split())
-            metadata['read_time'] = max(1, round(words / 200))
-
-            # Procesar Categoría y Tags para Sidebar
-            cat = metadata.get('category', 'Sin Categoría')
-            categories_count[cat] = categories_count.get(cat, 0) + 1
-
-            post_tags = [t.strip().lower() for t in str(metadata.get('tags', '')).split(',')] if metadata.get('tags') else []
-            for t in post_tags: tags_set.add(t)
-            metadata['tags_list'] = post_tags
-
-            # Lógica de Filtrado
-            match = True
-            if query and query not in metadata.get('title', '').lower() and query not in p_file.content.lower():
-                match = False
-            if tag_filter and tag_filter not in post_tags:
-                match = False
-            if cat_filter and cat_filter != cat.lower():
-                match = False
-
-            if match:
-                all_posts.append(metadata)
-
-    all_posts.sort(key=lambda x: str(x.get('date', '')), reverse=True)
-
-    # Lógica de paginación
-    total_posts = len(all_posts)
+    # Lógica de paginación: las facetas ya vienen ordenadas, basta un slice
+    total_posts = len(candidates)
     start = (page - 1) * per_page
     end = start + per_page
-    paginated_posts = all_posts[start:end]
+    paginated_posts = [entry.metadata for entry in candidates[start:end]]
 
     # Calcular si hay página siguiente o anterior
     has_next = end < total_posts
@@ -189,8 +301,8 @@ def index():
 
     return render_template('index.html', 
                            posts=paginated_posts, # Enviamos solo los 8 de la página
-                           categories=categories_count, 
-                           tags=sorted(list(tags_set)),
+                           categories=post_index.categories(), 
+                           tags=post_index.tags(),
                            query=query, 
                            current_tag=tag_filter, 
                            current_cat=cat_filter,
@@ -198,54 +310,72 @@ def index():
                            has_next=has_next,
                            has_prev=has_prev)
 
+@app.route('/tags')
+def tags_index():
+    # Todas las etiquetas con su cantidad de posts, desde las facetas del índice
+    log_visit()
+    key = ('tags', bool(session.get('logged_in')), config_store.get().digest)
+    return page_cache.get(key, lambda: render_template(
+        'facets.html', kind='tags', title='Etiquetas', facets=post_index.tag_counts()))
+
+@app.route('/categories')
+def categories_index():
+    log_visit()
+    key = ('categories', bool(session.get('logged_in')), config_store.get().digest)
+    return page_cache.get(key, lambda: render_template(
+        'facets.html', kind='categories', title='Categorías',
+        facets=dict(sorted(post_index.categories().items(), key=lambda item: str(item[0]).lower()))))
+
 @app.route('/post/<slug>')
 def post(slug):
-    path = os.path.join(CONTENT_DIR, f"{slug}.md")
-    if not os.path.exists(path):
+    entry = post_index.get(slug)
+    # Los borradores sólo los ve el admin (para revisarlos antes de publicar)
+    if entry is None or (entry.is_draft and not session.get('logged_in')):
         abort(404)
 
-    post = frontmatter.load(path)
-    content_html = markdown(post.content, extensions=['tables', 'fenced_code', 'nl2br'])
     log_visit(slug)
-    
-    comments_enabled = True
-    if os.path.exists('config.json'):
-        try:
-            with open('config.json', 'r') as f:
-                conf_data = json.load(f)
-                comments_enabled = conf_data.get('comments_enabled', True)
-        except:
-            comments_enabled = True # Si falla la lectura, por defecto prendidos
-    
-    # Leemos la URL desde el entorno, si no existe usamos localhost por defecto
-    comments_api_base = os.getenv('COMMENTS_API_URL', 'http://localhost:5003')
-    return render_template('post.html', post=post.metadata, content=content_html, comments_enabled=comments_enabled, slug=slug, comments_api_url=comments_api_base)
+    # Ajustes ya en memoria: sin leer config.json en cada visita
+    settings = config_store.get()
+
+    # Validador del HTML final: archivo del post + ajustes (comentarios, título...)
+    # + sesión de admin + relacionados + plantillas y assets. Si el cliente ya lo
+    # tiene, 304 sin renderizar el Markdown. Sin Last-Modified: la fecha del
+    # archivo no cambia cuando cambia todo lo demás y un If-Modified-Since
+    # solo daría 304 viejos.
+    logged_in = bool(session.get('logged_in'))
+    related = related_entries(slug)
+    etag = hashlib.sha1(repr((entry.digest, entry.stamp, settings.digest, logged_in,
+                              [(e.slug, e.stamp) for e in related],
+                              TEMPLATES_VERSION, asset_manifest.signature())).encode('utf-8')).hexdigest()
+
+    if not is_resource_modified(request.environ, etag=etag):
+        response = make_response('', 304)
+    else:
+        content_html = render_cache.render(slug, entry.content, entry.digest)
+        response = make_response(render_template('post.html', post=entry.metadata, content=content_html, comments_enabled=settings.comments_enabled, slug=slug, comments_api_url=settings.comments_api_url,
+                                                 related=[e.metadata for e in related]))
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    if entry.is_draft:
+        # Ni proxies ni el navegador guardan un borrador
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+    return response
 
 @app.route('/admin')
 @login_required
 def admin_list():
     posts = get_posts()
     
-    stats = {'daily': {}, 'posts': {}, 'total': 0} # Valores por defecto
-    
-    if os.path.exists(STATS_FILE):
-        try:
-            with open(STATS_FILE, 'r') as f:
-                content = f.read().strip()
-                if content:
-                    stats = json.loads(content)
-        except Exception as e:
-            print(f"Error cargando stats: {e}")
-            # Si falla, se queda con los valores por defecto (0)
-
-    # Procesar datos
-    post_stats = stats.get('posts', {})
-    top_posts = sorted(post_stats.items(), key=lambda item: item[1], reverse=True)[:3]
-    
-    daily_stats = stats.get('daily', {})
-    sorted_stats = dict(sorted(daily_stats.items(), reverse=True)[:7])
-    
+    visit_counter.flush()
+
+    # Procesar datos (consultas ya agregadas en el backend de estadísticas)
+    top_posts = stats_store.top_posts(3)
+
     # Gráfico últimos 7 días
+    first_day = (datetime.now() - timedelta(days=6)).strftime('%Y-%m-%d')
+    daily_stats = dict(stats_store.daily(since=first_day))
     last_7_days = []
     for i in range(6, -1, -1):
         d = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
@@ -253,15 +383,14 @@ def admin_list():
     
     max_visits = max([day['count'] for day in last_7_days] + [1])
     
-    config = get_config()
-    comments_on = config.get('comments_enabled', True)
+    comments_on = config_store.get().comments_enabled
     
     # Recuperamos el total histórico
-    total_visits = stats.get('total', 0)
+    total_visits = stats_store.total()
 
     return render_template('admin.html', 
                            posts=posts, 
-                           stats=sorted_stats,
+                           stats=daily_stats,
                            top_posts=top_posts,
                            stats_days=last_7_days, 
                            max_visits=max_visits,
@@ -281,34 +410,33 @@ def edit_post(slug):
         description = request.form.get('description', '').strip()
         status = request.form.get('status') # 'draft' o 'published'
 
-        # --- LÓGICA DE NOMBRES ---
-        # 1. Limpiamos el slug base (quitamos 'draft_' si ya lo tiene para procesar el nombre limpio)
-        clean_slug = slug.replace('draft_', '') if slug else slugify(title)
-        if not clean_slug: clean_slug = "post-sin-titulo"
-
-        # 2. Definimos el nuevo nombre según el estado elegido en el formulario
-        new_filename = f"draft_{clean_slug}.md" if status == 'draft' else f"{clean_slug}.md"
-        new_path = os.path.join(CONTENT_DIR, new_filename)
+        if status not in ('draft', 'published'):
+            status = 'published'
 
-        # 3. Si estamos editando y el nombre cambió (ej: pasó de borrador a público), borramos el viejo
-        if slug:
-            old_path = os.path.join(CONTENT_DIR, f"{slug}.md")
-            if old_path != new_path and os.path.exists(old_path):
-                os.remove(old_path)
+        # --- SLUG ---
+        # El estado va en el metadata, así que el slug no cambia al publicar.
+        # Los borradores viejos (draft_<slug>) pasan a <slug> la primera vez que se guardan.
+        clean_slug = slug.removeprefix('draft_') if slug else slugify(title)
+        if not clean_slug: clean_slug = "post-sin-titulo"
 
-        # 4. Crear objeto frontmatter y asignar metadatos
+        # Crear objeto frontmatter y asignar metadatos
         post_file = frontmatter.Post(content)
         post_file.metadata['title'] = title
         post_file.metadata['date'] = date
         post_file.metadata['category'] = category
         post_file.metadata['tags'] = tags
         post_file.metadata['description'] = description
-        # Guardamos el estado también en el metadata por si lo necesitas luego
-        post_file.metadata['status'] = status 
-
-        # 5. Guardar físicamente
-        with open(new_path, 'wb') as f:
-            frontmatter.dump(post_file, f)
+        post_file.metadata['status'] = status
+
+        # Guardado atómico: el post pasa de borrador a publicado (o al revés) en un solo paso
+        content_store.save(clean_slug, frontmatter.dumps(post_file))
+        if slug and slug != clean_slug:
+            content_store.delete(slug)
+            post_index.remove(slug)
+            render_cache.invalidate(slug)
+        post_index.update(clean_slug)
+        render_cache.invalidate(clean_slug)
+        content_changed()
 
         return redirect(url_for('admin_list'))
 
@@ -320,17 +448,16 @@ def edit_post(slug):
     }
 
     if slug:
-        path = os.path.join(CONTENT_DIR, f"{slug}.md")
-        if os.path.exists(path):
-            post = frontmatter.load(path)
+        entry = post_index.get(slug)
+        if entry is not None:
             post_data = {
-                "title": post.metadata.get('title', ''),
-                "content": post.content,
-                "date": post.metadata.get('date', ''),
-                "category": post.metadata.get('category', ''),
-                "tags": post.metadata.get('tags', ''),
-                "description": post.metadata.get('description', ''),
-                "status": "draft" if slug.startswith('draft_') else "published"
+                "title": entry.metadata.get('title', ''),
+                "content": entry.content,
+                "date": entry.metadata.get('date', ''),
+                "category": entry.metadata.get('category', ''),
+                "tags": entry.metadata.get('tags', ''),
+                "description": entry.metadata.get('description', ''),
+                "status": "draft" if entry.is_draft else "published"
             }
 
     return render_template('edit.html', post=post_data)
@@ -355,11 +482,26 @@ def save_post():
 @app.route('/admin/delete/<slug>', methods=['POST'])
 @login_required
 def delete_post(slug):
-    path = os.path.join(CONTENT_DIR, f"{slug}.md")
-    if os.path.exists(path):
-        os.remove(path)
+    content_store.delete(slug)
+    post_index.remove(slug)
+    render_cache.invalidate(slug)
+    content_changed()
     return redirect(url_for('admin_list'))
 
+@app.route('/admin/preview', methods=['POST'])
+@login_required
+def preview():
+    # {content, known: [hashes que el editor ya tiene]} -> bloques en orden; el
+    # HTML sólo viaja para los bloques que el editor todavía no tiene
+    data = request.get_json(silent=True) or {}
+    content = data.get('content')
+    if not isinstance(content, str):
+        return {"error": "Falta el contenido"}, 400
+    known = set(data.get('known') or [])
+    blocks = [{'hash': digest, 'html': None if digest in known else html}
+              for digest, html in preview_renderer.blocks(content)]
+    return {'blocks': blocks}
+
 @app.route('/admin/upload', methods=['POST'])
 @login_required
 def upload_file():
@@ -370,217 +512,188 @@ def upload_file():
         return {"error": "No selected file"}, 400
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-        # Devolvemos la URL para que el JS la use
-        return {"url": f"/static/uploads/{filename}"}, 200
+        # Guardado por trozos y deduplicado por sha256 (ver uploads.py)
+        info = upload_store.save(file, filename)
+        # Devolvemos la URL (y el srcset si es imagen) para que el JS la use
+        return info, 200
     return {"error": "File type not allowed"}, 400
 
 # Modificamos get_posts para que devuelva el contenido completo
 def get_all_posts_with_content():
     posts = []
-    for filename in os.listdir(CONTENT_DIR):
-        if filename.endswith(".md"):
-            path = os.path.join(CONTENT_DIR, filename)
-            post = frontmatter.load(path)
-            post.metadata['slug'] = filename[:-3]
-            # Incluir el contenido para buscar
-            post.metadata['full_content'] = post.content 
-            posts.append(post)
-    return sorted(posts, key=lambda x: x.metadata.get('date', ''), reverse=True)
+    for entry in post_index.entries():
+        post = frontmatter.Post(entry.content, **entry.metadata)
+        # Incluir el contenido para buscar
+        post.metadata['full_content'] = entry.content
+        posts.append(post)
+    return posts
 
 @app.route('/admin/backup')
 @login_required
 def backup():
-    backup_filename = f"cms_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-    backup_path = os.path.join('/tmp', backup_filename) # Guardamos temporalmente
-
-    with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # Añadir posts
-        for root, _, files in os.walk(CONTENT_DIR):
-            for file in files:
-                zipf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), os.path.join(app.root_path, 'content')))
-
-        # Añadir uploads
-        for root, _, files in os.walk(UPLOAD_FOLDER):
-            for file in files:
-                zipf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), os.path.join(app.root_path, 'static')))
+    # ?mode=full (por defecto), incremental o differential
+    mode = request.args.get('mode', 'full')
+    if mode not in BACKUP_MODES:
+        mode = 'full'
 
-    return send_file(backup_path, as_attachment=True, download_name=backup_filename)
+    # El zip se arma y se envía a la vez, sin pasar por /tmp
+    mode, stream = backup_manager.stream(mode)
+    backup_filename = f"cms_backup_{mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return Response(stream, mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={backup_filename}'})
 
 @app.route('/rss.xml')
 def rss():
-    posts = get_posts()
-    # Filtramos para que solo aparezcan los publicados
-    published_posts = [p for p in posts if p.get('published', True)]
-    
-    # Ordenar por fecha (asumiendo formato YYYY-MM-DD)
-    published_posts.sort(key=lambda x: x['date'], reverse=True)
-
-    rss_xml = '<?xml version="1.0" encoding="UTF-8" ?>'
-    rss_xml += '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">'
-    rss_xml += '<channel>'
-    rss_xml += '<title>NeoSite Blog</title>'
-    rss_xml += '<link>https://blog.neosite.com.ar</link>'
-    rss_xml += '<description>Últimas entradas de NeoSite Blog</description>'
-    
-    base_url = request.url_root.rstrip('/')
-    
-    for post in published_posts:
-        # Limpiamos un poco el contenido si es necesario o lo enviamos tal cual
-        content = post.get('content', '').replace('src="/static/', 'src="https://blog.neosite.com.ar/static/')
-        post_url = f"{base_url}/post/{post['slug']}"
-        
-        rss_xml += '<item>'
-        rss_xml += f'<title>{post["title"]}</title>'
-        rss_xml += f'<link>{post_url}</link>'
-        rss_xml += f'<guid>{post_url}</guid>'
-        rss_xml += f'<pubDate>{post["date"]}</pubDate>'
-        rss_xml += f'<description><![CDATA[{content}]]></description>'
-        rss_xml += '</item>'
-    
-    rss_xml += '</channel></rss>'
-    
-    return Response(rss_xml, mimetype='application/rss+xml')
+    # ?full=1 (o RSS_FULL_CONTENT=1) agrega el HTML completo de cada post
+    full = request.args.get('full') == '1' or RSS_FULL_CONTENT
+    settings = config_store.get()
+    base_url = (settings.site_url or request.url_root).rstrip('/')
+
+    def build():
+        items = []
+        for entry in feed_cache.entries(RSS_ITEMS):
+            item = dict(entry.metadata, pub_date=rfc822_date(entry.metadata.get('date')))
+            if full:
+                # Las rutas relativas de las subidas no sirven fuera del sitio
+                html = render_cache.render(entry.slug, entry.content, entry.digest)
+                item['content_html'] = html.replace('src="/static/', f'src="{base_url}/static/')
+            items.append(item)
+        return render_template('rss.xml', posts=items, site_title=settings.site_title, base_url=base_url,
+                               last_build_date=format_datetime(feed_cache.last_modified()))
+
+    xml, etag, last_modified = feed_cache.get((full, base_url), build, settings.digest)
+    response = Response(xml, mimetype='application/rss+xml')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
+@app.route('/admin/cache-stats')
+@login_required
+def cache_stats():
+    # Efectividad de la cache de HTML renderizado (hits/misses) y de la del listado
+    return dict(render_cache.stats(), pages=page_cache.stats(), compression=compressor.stats(),
+                preview=preview_renderer.stats())
 
 @app.route('/admin/export-stats')
 @login_required
 def export_stats():
-    return send_file(STATS_FILE, as_attachment=True)
+    visit_counter.flush()
+    fmt = 'csv' if request.args.get('format') == 'csv' else 'json'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/json'
+    return Response(iter_export(stats_store, fmt), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=stats.{fmt}'})
     
 @app.route('/admin/stats')
 @login_required
 def full_stats():
-    if not os.path.exists(STATS_FILE):
+    visit_counter.flush()
+    total = stats_store.total()
+    if not total:
         return "No hay estadísticas registradas aún."
 
-    with open(STATS_FILE, 'r') as f:
-        stats = json.load(f)
-
-    # Ordenamos los días para que el historial sea cronológico
-    sorted_days = sorted(stats.get('daily', {}).items(), reverse=True)
+    # Días del más reciente al más antiguo
+    sorted_days = stats_store.daily()
     
-    # Ordenamos los posts más leídos (Top 10)
-    sorted_posts = sorted(stats.get('posts', {}).items(), key=lambda x: x[1], reverse=True)[:10]
+    # Los posts más leídos (Top 10)
+    sorted_posts = stats_store.top_posts(10)
+
+    # Únicos y tops salen de los sketches ya agregados (estimaciones)
+    uniques_total = stats_store.estimates('uniques:total').get('', 0)
+    uniques_daily = stats_store.estimates('uniques:day:')
+    uniques_posts = stats_store.estimates('uniques:post:')
+    referrers = stats_store.sketch('top:referrers')
+    user_agents = stats_store.sketch('top:user_agents')
 
     return render_template('full_stats.html', 
-                           total=stats.get('total', 0),
+                           total=total,
                            history=sorted_days, 
-                           top_posts=sorted_posts)
+                           top_posts=sorted_posts,
+                           uniques_total=uniques_total,
+                           uniques_daily=uniques_daily,
+                           uniques_posts=uniques_posts,
+                           top_referrers=referrers.top(10) if referrers else [],
+                           top_user_agents=user_agents.top(10) if user_agents else [])
 
 @app.route('/admin/comments')
 @login_required
 def admin_comments():
-    all_comments = []
-    
-    # 1. Definimos la ruta de búsqueda primero
-    # Asegúrate de que COMMENTS_DATA_DIR esté definida al inicio de app.py
-    search_path = os.path.join(COMMENTS_DATA_DIR, "*.json")
-    
-    # 2. Ahora sí podemos imprimirla para debuguear
-    print(f"DEBUG: Buscando comentarios en: {search_path}") 
-    
-    # 3. Buscamos los archivos
-    files = glob.glob(search_path)
-    print(f"DEBUG: Archivos encontrados: {files}")
+    # Cola de moderación paginada desde los índices de comments.db
+    status = request.args.get('status', 'pending')
+    if status not in ('pending', 'approved', 'all'):
+        status = 'pending'
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 50
+
+    comments = comment_store.moderation_page(status, page, per_page + 1)
+    counts = comment_store.counts()
+
+    return render_template('admin_comments.html',
+                           comments=comments[:per_page],
+                           counts=counts,
+                           status=status,
+                           page=page,
+                           has_next=len(comments) > per_page,
+                           has_prev=page > 1)
 
-    for file_path in files:
-        # El slug es el nombre del archivo sin el .json
-        slug = os.path.basename(file_path).replace('.json', '')
-        
+@app.route('/admin/comments/bulk', methods=['POST'])
+@login_required
+def bulk_comments():
+    # Cada checkbox llega como "<slug>|<id>"
+    items = []
+    for value in request.form.getlist('ids'):
+        slug, _, comment_id = value.rpartition('|')
         try:
-            with open(file_path, 'r') as f:
-                post_comments = json.load(f)
-                for c in post_comments:
-                    # Le inyectamos el slug para que el template sepa de qué post es
-                    c['slug'] = slug 
-                    all_comments.append(c)
-        except Exception as e:
-            print(f"Error leyendo {file_path}: {e}")
-    
-    # Ordenar por ID (timestamp) descendente para ver los nuevos arriba
-    all_comments.sort(key=lambda x: x.get('id', 0), reverse=True)
-    
-    return render_template('admin_comments.html', comments=all_comments)
+            items.append((slug, float(comment_id)))
+        except ValueError:
+            continue
+
+    if request.form.get('action') == 'approve':
+        comment_store.approve_many(items)
+    elif request.form.get('action') == 'delete':
+        comment_store.delete_many(items)
+
+    return redirect(url_for('admin_comments', status=request.form.get('status', 'pending'),
+                            page=request.form.get('page', 1)))
 
 @app.route('/admin/comments/approve/<slug>/<float:comment_id>')
 @login_required
 def approve_comment(slug, comment_id):
-    file_path = os.path.join(COMMENTS_DATA_DIR, f"{slug}.json")
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            comments = json.load(f)
-        
-        for c in comments:
-            if c['id'] == comment_id:
-                c['approved'] = True
-                break
-        
-        with open(file_path, 'w') as f:
-            json.dump(comments, f, indent=4)
-            
+    comment_store.approve(slug, comment_id)
     return redirect(url_for('admin_comments'))
 
 @app.route('/admin/comments/delete/<slug>/<float:comment_id>')
 @login_required
 def delete_comment(slug, comment_id):
-    file_path = os.path.join(COMMENTS_DATA_DIR, f"{slug}.json")
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            comments = json.load(f)
-        
-        # Creamos una nueva lista excluyendo el comentario con ese ID
-        new_comments = [c for c in comments if c['id'] != comment_id]
-        
-        # Si el archivo queda vacío después de borrar, podemos optar por eliminarlo 
-        # o guardarlo como una lista vacía. Guardarlo vacío es más seguro.
-        with open(file_path, 'w') as f:
-            json.dump(new_comments, f, indent=4)
-            
+    comment_store.delete(slug, comment_id)
     return redirect(url_for('admin_comments'))
 
 @app.route('/admin/settings/toggle-comments')
 @login_required
 def toggle_comments():
-    config_path = 'config.json'
-    config = {'comments_enabled': True} # Valor por defecto
-
-    # Intentamos leer el archivo con seguridad
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, 'r') as f:
-                content = f.read().strip()
-                if content: # Solo intentamos cargar si hay texto
-                    config = json.loads(content)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"Error cargando config, reseteando: {e}")
-            config = {'comments_enabled': True}
-
-    # Invertimos el estado de forma segura
-    current_state = config.get('comments_enabled', True)
-    config['comments_enabled'] = not current_state
-    
-    # Guardamos (esto escribirá el JSON correctamente y dejará de estar vacío)
-    with open(config_path, 'w') as f:
-        json.dump(config, f, indent=4)
+    # Lee y escribe config.json bajo lock y con reemplazo atómico (ver settings.py)
+    config_store.toggle('comments_enabled')
+    content_changed()
         
     return redirect(url_for('admin_list'))
 
-def get_config():
-    config_path = 'config.json'
-    default_config = {'comments_enabled': True}
-    
-    if not os.path.exists(config_path):
-        return default_config
-        
-    try:
-        with open(config_path, 'r') as f:
-            content = f.read().strip()
-            if not content:  # Si el archivo está vacío
-                return default_config
-            return json.loads(content)
-    except (json.JSONDecodeError, Exception):
-        return default_config
+@app.cli.command('freeze')
+@click.option('--clean', is_flag=True, help='Regenera todas las páginas, no sólo las que cambiaron.')
+def freeze_command(clean):
+    """Genera el sitio público estático en STATIC_OUTPUT_DIR."""
+    related_posts.hold()
+    related_posts.rebuild()
+    written, removed = freezer.sync(clean=clean)
+    click.echo(f"{written} páginas escritas y {removed} borradas en {STATIC_OUTPUT_DIR}")
+
+@app.cli.command('build-variants')
+def build_variants_command():
+    """Genera las versiones redimensionadas que falten de las imágenes subidas."""
+    created = upload_store.build_all_variants()
+    click.echo(f"{created} variantes nuevas en {UPLOAD_FOLDER}")
 
 if __name__ == '__main__':
+    # Sólo para desarrollo; en producción: gunicorn -c gunicorn.conf.py wsgi:app
     # host='0.0.0.0' es fundamental en Docker
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
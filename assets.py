@@ -0,0 +1,131 @@
+"""
+Archivos de static/ con huella (fingerprint) para cachearlos "para siempre".
+
+asset_url('style.css') devuelve /assets/style.<hash>.css; como la URL cambia
+cuando cambia el contenido, esa respuesta se sirve con
+Cache-Control: immutable. Para CSS/JS/SVG se generan al lado copias .gz (y
+.br si está instalado el paquete brotli) que se envían tal cual cuando el
+navegador las acepta.
+"""
+import gzip
+import hashlib
+import os
+import re
+import threading
+
+from atomic_io import atomic_write_bytes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+COMPRESSIBLE_EXTENSIONS = {'css', 'js', 'svg', 'txt', 'xml', 'json', 'html'}
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+FINGERPRINTED_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % FINGERPRINT_LENGTH)
+
+
+def fingerprinted_name(rel_path, digest):
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+
+class AssetManifest:
+    def __init__(self, static_dir, url_prefix='/assets', exclude=('uploads',)):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix.rstrip('/')
+        self.exclude = exclude
+        self._entries = {}   # rel_path -> (stamp, nombre con huella)
+        self._lock = threading.Lock()
+
+    def _excluded(self, rel_path):
+        return rel_path.split('/', 1)[0] in self.exclude or rel_path.endswith(('.gz', '.br'))
+
+    def _compress_siblings(self, path):
+        ext = path.rsplit('.', 1)[-1].lower()
+        if ext not in COMPRESSIBLE_EXTENSIONS:
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        outputs = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            outputs.append(('.br', lambda d: brotli.compress(d, quality=11)))
+        mtime = os.stat(path).st_mtime_ns
+        for suffix, compress in outputs:
+            target = path + suffix
+            try:
+                if os.stat(target).st_mtime_ns >= mtime:
+                    continue
+            except FileNotFoundError:
+                pass
+            atomic_write_bytes(target, compress(data), durable=False)
+
+    def _entry(self, rel_path):
+        """(nombre con huella) de rel_path, recalculado si el archivo cambió en disco."""
+        path = os.path.join(self.static_dir, rel_path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._entries.get(rel_path)
+            if cached and cached[0] == stamp:
+                return cached[1]
+
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        try:
+            self._compress_siblings(path)
+        except OSError as e:
+            print(f"No se pudieron precomprimir {rel_path}: {e}")
+        name = fingerprinted_name(rel_path, digest)
+        with self._lock:
+            self._entries[rel_path] = (stamp, name)
+        return name
+
+    def build(self):
+        """Calcula de una vez la huella de todo static/ (menos las subidas)."""
+        for root, _, names in os.walk(self.static_dir):
+            for name in names:
+                rel_path = os.path.relpath(os.path.join(root, name), self.static_dir).replace(os.sep, '/')
+                if not self._excluded(rel_path):
+                    self._entry(rel_path)
+
+    def url(self, filename):
+        name = self._entry(filename)
+        if name is None:
+            return f"/static/{filename}"
+        return f"{self.url_prefix}/{name}"
+
+    def signature(self):
+        """Hash de todas las huellas: cambia si cambia cualquier asset ya visto."""
+        with self._lock:
+            names = sorted(name for _, name in self._entries.values())
+        return hashlib.sha1('\n'.join(names).encode('utf-8')).hexdigest()[:FINGERPRINT_LENGTH]
+
+    def resolve(self, fingerprinted):
+        """
+        Devuelve (ruta real, es_la_versión_actual) para un nombre con huella, o
+        None. Un hash viejo sigue sirviendo el archivo actual, pero sin immutable.
+        """
+        match = FINGERPRINTED_RE.match(fingerprinted)
+        if not match:
+            return None
+        rel_path = match.group('stem') + match.group('ext')
+        if self._excluded(rel_path):
+            return None
+        name = self._entry(rel_path)
+        if name is None:
+            return None
+        return rel_path, name == fingerprinted
+
+    def precompressed(self, rel_path, accept_encodings):
+        """(encoding, ruta del hermano comprimido) que acepte el cliente, o None."""
+        for encoding, suffix in PRECOMPRESSED:
+            if accept_encodings[encoding] and os.path.exists(os.path.join(self.static_dir, rel_path + suffix)):
+                return encoding, rel_path + suffix
+        return None
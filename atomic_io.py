@@ -0,0 +1,4 @@
+# El código vive en comments_service/atomic_io.py para que la imagen del
+# microservicio de comentarios (que se construye sólo con ese directorio) lo
+# tenga; el CMS lo sigue importando como "atomic_io".
+from comments_service.atomic_io import atomic_open, atomic_write_bytes, atomic_write_json, atomic_write_text, file_lock  # noqa: F401
@@ -0,0 +1,248 @@
+"""
+Backups en .zip generados al vuelo: el archivo se va enviando al cliente a
+medida que se arma, sin temporales en /tmp.
+
+Modos:
+- full: todo content/ y static/uploads.
+- incremental: sólo lo que cambió desde el último backup (de cualquier tipo).
+- differential: sólo lo que cambió desde el último backup completo.
+
+Las bases SQLite (content.db con CONTENT_BACKEND=sqlite) no se copian como
+archivos, que pueden estar a medio escribir con WAL: se saca una copia
+consistente con la API de backup de sqlite3 y esa es la que va al zip.
+
+Cada backup termina con un backup-manifest.json (tamaño, mtime y sha256 de
+todos los archivos, más los borrados) y, si la descarga se completó, se
+guarda en BACKUP_STATE_DIR como base de los siguientes.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+from atomic_io import atomic_write_json
+
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_NAME = 'backup-manifest.json'
+
+# Formatos ya comprimidos: recomprimirlos sólo gasta CPU
+STORED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'mp3', 'mp4', 'webm', 'ogg',
+                     'zip', 'gz', 'br'}
+
+MODES = ('full', 'incremental', 'differential')
+
+
+class _StreamBuffer:
+    """Destino no 'seekable' para ZipFile: acumula lo escrito hasta que lo drenamos."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sqlite_files(db_path):
+    """La base y sus archivos auxiliares (WAL, shm, journal)."""
+    return {os.path.abspath(db_path + suffix) for suffix in ('', '-wal', '-shm', '-journal')}
+
+
+def collect_files(sources, skip=()):
+    """{nombre en el zip: (ruta, stat)} para cada (directorio, prefijo) de sources."""
+    files = {}
+    for root_dir, prefix in sources:
+        for root, _, names in os.walk(root_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                if os.path.abspath(path) in skip:
+                    continue
+                arcname = os.path.join(prefix, os.path.relpath(path, root_dir))
+                try:
+                    files[arcname] = (path, os.stat(path))
+                except FileNotFoundError:
+                    continue
+    return files
+
+
+def zip_info(arcname, st):
+    """Como ZipInfo.from_file, pero a partir de un stat ya hecho."""
+    date_time = time.localtime(st.st_mtime)[:6]
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    zinfo = zipfile.ZipInfo(arcname, date_time)
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    ext = arcname.rsplit('.', 1)[-1].lower() if '.' in arcname else ''
+    zinfo.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    return zinfo
+
+
+def snapshot_sqlite(db_path, dest_path):
+    """Copia consistente de una base SQLite aunque otros procesos estén escribiendo."""
+    src = sqlite3.connect(db_path, timeout=30)
+    dest = sqlite3.connect(dest_path)
+    try:
+        with dest:
+            src.backup(dest)
+    finally:
+        dest.close()
+        src.close()
+
+
+class BackupManager:
+    def __init__(self, sources, state_dir, databases=()):
+        # sources: [(directorio, prefijo dentro del zip)]
+        # databases: [(ruta de la base SQLite, nombre dentro del zip)]
+        self.sources = sources
+        self.state_dir = state_dir
+        self.databases = databases
+
+    def _state_path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def _load_state(self, name):
+        try:
+            with open(self._state_path(name), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _save_state(self, manifest):
+        os.makedirs(self.state_dir, exist_ok=True)
+        names = ['last.json'] + (['last_full.json'] if manifest['mode'] == 'full' else [])
+        for name in names:
+            atomic_write_json(self._state_path(name), manifest, indent=None)
+
+    def base_manifest(self, mode):
+        if mode == 'incremental':
+            return self._load_state('last.json')
+        if mode == 'differential':
+            return self._load_state('last_full.json')
+        return None
+
+    def plan(self, mode):
+        """
+        Decide qué archivos van en el zip. Los que no cambiaron de tamaño ni de
+        mtime respecto de la base se saltean sin leerlos; si cambió el mtime pero
+        el hash es el mismo, tampoco se incluyen.
+        Devuelve (modo efectivo, {arcname: (ruta, stat, sha256 o None)}, manifiesto).
+        """
+        base = self.base_manifest(mode)
+        if base is None:
+            mode = 'full'
+        base_files = base['files'] if base else {}
+
+        skip = set()
+        for db_path, _ in self.databases:
+            skip |= sqlite_files(db_path)
+        files = collect_files(self.sources, skip)
+        files.update(self._snapshots())
+        include = {}
+        manifest_files = {}
+        for arcname, (path, st) in sorted(files.items()):
+            previous = base_files.get(arcname)
+            record = {'size': st.st_size, 'mtime': st.st_mtime, 'sha256': None}
+            if previous and previous['size'] == st.st_size and previous['mtime'] == st.st_mtime:
+                record['sha256'] = previous['sha256']
+            elif previous and previous['size'] == st.st_size:
+                digest = file_sha256(path)
+                record['sha256'] = digest
+                if digest != previous['sha256']:
+                    include[arcname] = (path, st, digest)
+            else:
+                include[arcname] = (path, st, None)
+            manifest_files[arcname] = record
+
+        manifest = {
+            'mode': mode,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'base': base['created'] if base else None,
+            'files': manifest_files,
+            'included': sorted(include),
+            'deleted': sorted(set(base_files) - set(manifest_files)),
+        }
+        return mode, include, manifest
+
+    def _snapshot_path(self, arcname):
+        return self._state_path(f"snapshot-{os.getpid()}-{threading.get_ident()}-{arcname.replace('/', '_')}")
+
+    def _snapshots(self):
+        """{arcname: (ruta de la copia, stat)} de cada base, copiada en state_dir."""
+        os.makedirs(self.state_dir, exist_ok=True)
+        snapshots = {}
+        for db_path, arcname in self.databases:
+            if not os.path.exists(db_path):
+                continue
+            path = self._snapshot_path(arcname)
+            snapshot_sqlite(db_path, path)
+            snapshots[arcname] = (path, os.stat(path))
+        return snapshots
+
+    def _remove_snapshots(self):
+        for _, arcname in self.databases:
+            try:
+                os.remove(self._snapshot_path(arcname))
+            except FileNotFoundError:
+                pass
+
+    def stream(self, mode='full'):
+        """Devuelve (modo efectivo, generador de bytes del zip)."""
+        mode, include, manifest = self.plan(mode)
+        return mode, self._generate(include, manifest)
+
+    def _generate(self, include, manifest):
+        try:
+            yield from self._zip(include, manifest)
+        finally:
+            # También si el cliente cortó la descarga a mitad
+            self._remove_snapshots()
+
+    def _zip(self, include, manifest):
+        buf = _StreamBuffer()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for arcname, (path, st, known_digest) in include.items():
+                digest = hashlib.sha256()
+                try:
+                    # El ZipInfo sale del archivo ya abierto: si se borró, no llega a empezar la entrada
+                    with open(path, 'rb') as src:
+                        zinfo = zip_info(arcname, os.fstat(src.fileno()))
+                        with zipf.open(zinfo, 'w', force_zip64=zinfo.file_size >= zipfile.ZIP64_LIMIT) as dest:
+                            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                                digest.update(chunk)
+                                dest.write(chunk)
+                                data = buf.drain()
+                                if data:
+                                    yield data
+                except FileNotFoundError:
+                    # Se borró mientras armábamos el backup
+                    manifest['files'].pop(arcname, None)
+                    manifest['included'].remove(arcname)
+                    continue
+                manifest['files'][arcname]['sha256'] = known_digest or digest.hexdigest()
+
+            zipf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1))
+        yield buf.drain()
+
+        # Sólo si el cliente recibió todo el zip lo tomamos como base del próximo
+        self._save_state(manifest)
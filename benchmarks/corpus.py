@@ -0,0 +1,138 @@
+"""
+Corpus sintético para los benchmarks: posts con frontmatter, tamaños
+variables, etiquetas con distribución tipo Zipf, bloques de código y tablas,
+más comentarios (aprobados y pendientes) en comments.db.
+
+Con la misma semilla se genera siempre el mismo corpus.
+
+    python benchmarks/corpus.py /tmp/corpus --posts 5000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from comments_service.comment_store import CommentStore  # noqa: E402
+
+WORDS = (
+    "python flask servidor cache índice búsqueda rendimiento memoria disco red "
+    "latencia proceso hilo archivo plantilla markdown blog post etiqueta categoría "
+    "comentario visita estadística backup imagen nginx docker gunicorn sqlite json "
+    "canción podcast programación linux terminal teclado pantalla código función "
+    "clase módulo prueba error excepción consulta tabla columna fila página enlace"
+).split()
+CATEGORIES = ['Programación', 'Linux', 'Música', 'Podcast', 'Opinión', 'Tutoriales', 'Noticias', 'Sin Categoría']
+TAGS = [f"tag{i}" for i in range(200)]
+
+CODE_BLOCK = """```python
+def fib(n):
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+```
+"""
+
+TABLE = """| columna | valor | nota |
+|---|---|---|
+| uno | 1 | primera |
+| dos | 2 | segunda |
+"""
+
+
+def sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def paragraph(rng):
+    return ' '.join(sentence(rng, rng.randint(6, 18)) for _ in range(rng.randint(2, 6)))
+
+
+def post_body(rng, paragraphs):
+    parts = []
+    for _ in range(paragraphs):
+        parts.append(paragraph(rng))
+        roll = rng.random()
+        if roll < 0.15:
+            parts.append(CODE_BLOCK)
+        elif roll < 0.22:
+            parts.append(TABLE)
+        elif roll < 0.30:
+            parts.append(f"## {sentence(rng, 4)}")
+    return '\n\n'.join(parts)
+
+
+def zipf_tags(rng, count):
+    # Pocas etiquetas muy usadas y muchas raras, como en un blog real
+    chosen = set()
+    while len(chosen) < count:
+        index = min(int(rng.paretovariate(1.1)) - 1, len(TAGS) - 1)
+        chosen.add(TAGS[index])
+    return sorted(chosen)
+
+
+def generate(output_dir, posts=100, seed=1, min_paragraphs=2, max_paragraphs=30,
+             max_comments=40, draft_ratio=0.03):
+    """
+    Crea <output_dir>/content/*.md y <output_dir>/comments_data/comments.db.
+    Devuelve la lista de slugs publicados.
+    """
+    rng = random.Random(seed)
+    content_dir = os.path.join(output_dir, 'content')
+    os.makedirs(content_dir, exist_ok=True)
+    start = date(2015, 1, 1)
+
+    slugs = []
+    comment_rows = []
+    for i in range(posts):
+        slug = f"post-{i:05d}"
+        draft = rng.random() < draft_ratio
+        tags = zipf_tags(rng, rng.randint(0, 5))
+        day = start + timedelta(days=rng.randint(0, 3650))
+        title = sentence(rng, rng.randint(3, 8)).rstrip('.')
+        body = post_body(rng, rng.randint(min_paragraphs, max_paragraphs))
+        with open(os.path.join(content_dir, f"{slug}.md"), 'w', encoding='utf-8') as f:
+            f.write("---\n")
+            f.write(f"title: '{title}'\n")
+            f.write(f"status: {'draft' if draft else 'published'}\n")
+            f.write(f"date: '{day.isoformat()}'\n")
+            f.write(f"category: {rng.choice(CATEGORIES)}\n")
+            f.write(f"tags: {', '.join(tags)}\n")
+            f.write(f"description: '{sentence(rng, 10)}'\n")
+            f.write("---\n\n")
+            f.write(body)
+        if draft:
+            continue
+        slugs.append(slug)
+        # Muchos posts sin comentarios y unos pocos con muchos
+        for _ in range(int(rng.expovariate(1.0) * max_comments / 4) if rng.random() < 0.6 else 0):
+            comment_rows.append((slug, f"Lector {rng.randint(1, 500)}", sentence(rng, rng.randint(5, 40)),
+                                 rng.random() < 0.7))
+
+    store = CommentStore(os.path.join(output_dir, 'comments_data'))
+    with store._write() as conn:
+        for seq, (slug, author, text, approved) in enumerate(comment_rows):
+            conn.execute(
+                "INSERT INTO comments (slug, id, author, text, date, approved) VALUES (?, ?, ?, ?, ?, ?)",
+                (slug, 1.6e9 + seq, author, text, '2025-01-01 12:00', int(approved)))
+        store._rebuild_counts(conn)
+    return slugs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera un corpus sintético de posts y comentarios')
+    parser.add_argument('output_dir')
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    slugs = generate(args.output_dir, posts=args.posts, seed=args.seed)
+    print(f"{len(slugs)} posts publicados en {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
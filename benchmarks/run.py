@@ -0,0 +1,316 @@
+"""
+Benchmarks de los caminos calientes del CMS y del servicio de comentarios.
+
+Genera un corpus sintético en un directorio temporal, levanta ambas apps
+apuntando a él y mide cada escenario con el test client de Flask, repartiendo
+las peticiones entre varios procesos (fork) para simular carga concurrente.
+Informa p50/p99 y peticiones por segundo.
+
+    python benchmarks/run.py --posts 1000
+    python benchmarks/run.py --posts 1000 --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --posts 1000 --baseline benchmarks/baseline.json
+
+Con --baseline termina con código 1 si algún escenario empeoró más que la
+tolerancia (--tolerance para p50 y throughput, el doble para p99, que es más
+ruidoso). La línea base sólo se compara si se generó con el mismo --posts.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import corpus  # noqa: E402
+
+SCENARIOS = {}
+ctx = {}
+
+
+def scenario(name, admin=False, service='cms'):
+    """Registra fn(client, rng) -> código de estado como escenario."""
+    def register(fn):
+        SCENARIOS[name] = {'fn': fn, 'admin': admin, 'service': service}
+        return fn
+    return register
+
+
+# --- Preparación ---
+
+def prepare(workdir, posts, seed):
+    """Corpus + entorno aislado en workdir; importa las dos apps ya configuradas."""
+    slugs = corpus.generate(workdir, posts=posts, seed=seed)
+    # El servicio de comentarios lee data/comments: mismo comments.db que el CMS
+    os.makedirs(os.path.join(workdir, 'data'), exist_ok=True)
+    os.symlink(os.path.join(workdir, 'comments_data'), os.path.join(workdir, 'data', 'comments'))
+
+    os.chdir(workdir)
+    os.environ.update({
+        'CONTENT_BACKEND': 'files',
+        'STATS_BACKEND': 'sqlite',
+        'STATS_DB': os.path.join(workdir, 'stats.db'),
+        'PAGE_CACHE_BACKEND': 'memory',
+        'STATIC_OUTPUT_DIR': os.path.join(workdir, '_site'),
+        'BACKUP_STATE_DIR': os.path.join(workdir, 'backups'),
+        'METRICS_DIR': '',
+        # comments_post manda todo desde la misma IP
+        'COMMENT_RATE_PER_MINUTE': '0',
+    })
+    os.environ.pop('RENDER_CACHE_DIR', None)
+
+    import app as cms
+    sys.path.insert(0, os.path.join(ROOT, 'comments_service'))
+    import comments as comments_app
+
+    cms.post_index.refresh(force=True)
+    ctx.update(cms=cms, comments=comments_app, slugs=slugs, posts=posts,
+               tags=cms.post_index.tags(), categories=[str(c).lower() for c in cms.post_index.categories()])
+
+
+def make_client(spec):
+    if spec['service'] == 'comments':
+        return ctx['comments'].app.test_client()
+    client = ctx['cms'].app.test_client()
+    if spec['admin']:
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+    return client
+
+
+def pages_for(count):
+    return max(1, count // ctx['cms'].config_store.get().per_page)
+
+
+# --- Escenarios ---
+
+@scenario('index')
+def index(client, rng):
+    return client.get(f"/?page={rng.randint(1, min(pages_for(len(ctx['slugs'])), 20))}").status_code
+
+
+@scenario('index_uncached')
+def index_uncached(client, rng):
+    ctx['cms'].page_cache.bump()
+    return client.get(f"/?page={rng.randint(1, min(pages_for(len(ctx['slugs'])), 20))}").status_code
+
+
+@scenario('index_search')
+def index_search(client, rng):
+    ctx['cms'].page_cache.bump()
+    return client.get(f"/?q={rng.choice(corpus.WORDS)}").status_code
+
+
+@scenario('index_tag_deep_page')
+def index_tag_deep_page(client, rng):
+    ctx['cms'].page_cache.bump()
+    tag = rng.choice(ctx['tags'][:10] or [''])
+    page = rng.randint(1, pages_for(len(ctx['cms'].post_index.filtered(tag))))
+    return client.get(f"/?tag={tag}&page={page}").status_code
+
+
+@scenario('index_category')
+def index_category(client, rng):
+    ctx['cms'].page_cache.bump()
+    return client.get(f"/?category={rng.choice(ctx['categories'])}").status_code
+
+
+@scenario('post')
+def post(client, rng):
+    return client.get(f"/post/{rng.choice(ctx['slugs'])}").status_code
+
+
+@scenario('post_render')
+def post_render(client, rng):
+    slug = rng.choice(ctx['slugs'])
+    ctx['cms'].render_cache.invalidate(slug)
+    return client.get(f"/post/{slug}").status_code
+
+
+@scenario('rss')
+def rss(client, rng):
+    return client.get('/rss.xml').status_code
+
+
+@scenario('rss_full')
+def rss_full(client, rng):
+    return client.get('/rss.xml?full=1').status_code
+
+
+@scenario('admin_comments', admin=True)
+def admin_comments(client, rng):
+    status = rng.choice(['pending', 'approved', 'all'])
+    return client.get(f"/admin/comments?status={status}&page={rng.randint(1, 5)}").status_code
+
+
+@scenario('comments_get', service='comments')
+def comments_get(client, rng):
+    return client.get(f"/comments/{rng.choice(ctx['slugs'])}").status_code
+
+
+@scenario('comments_post', service='comments')
+def comments_post(client, rng):
+    payload = {'author': f"Bench {rng.randint(1, 100)}", 'text': corpus.sentence(rng, 20)}
+    return client.post(f"/comments/{rng.choice(ctx['slugs'])}", json=payload).status_code
+
+
+# --- Ejecución ---
+
+def _worker(args):
+    name, requests, seed = args
+    spec = SCENARIOS[name]
+    rng = random.Random(seed)
+    client = make_client(spec)
+    latencies = []
+    errors = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        status = spec['fn'](client, rng)
+        latencies.append(time.perf_counter() - start)
+        if status >= 400:
+            errors += 1
+    return latencies, errors
+
+
+def _visit_worker(args):
+    # log_visit() con varios procesos escribiendo a la vez en el almacén
+    hits, seed = args
+    cms = ctx['cms']
+    rng = random.Random(seed)
+    latencies = []
+    with cms.app.test_request_context('/'):
+        for _ in range(hits):
+            slug = rng.choice(ctx['slugs'])
+            start = time.perf_counter()
+            cms.log_visit(slug)
+            latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    cms.visit_counter.flush()
+    latencies.append(time.perf_counter() - start)
+    return latencies, 0
+
+
+def run_parallel(target, jobs, processes):
+    if processes == 1:
+        return [target(job) for job in jobs]
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        return pool.map(target, jobs)
+
+
+def summarize(results, wall):
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(latencies[count // 2] * 1000, 3),
+        'p99_ms': round(latencies[min(count - 1, int(count * 0.99))] * 1000, 3),
+        'rps': round(count / wall, 1),
+    }
+
+
+def run_scenario(name, requests, processes, seed):
+    # Calentamos en el padre: los procesos hijos heredan índices y caches
+    _worker((name, max(1, requests // 20), seed))
+    per_process = max(1, requests // processes)
+    jobs = [(name, per_process, seed + i) for i in range(processes)]
+    start = time.perf_counter()
+    results = run_parallel(_worker, jobs, processes)
+    return summarize(results, time.perf_counter() - start)
+
+
+def run_log_visit(requests, processes, seed):
+    cms = ctx['cms']
+    cms.visit_counter.flush()
+    before = cms.stats_store.total()
+    per_process = max(1, requests // processes)
+    start = time.perf_counter()
+    results = run_parallel(_visit_worker, [(per_process, seed + i) for i in range(processes)], processes)
+    summary = summarize(results, time.perf_counter() - start)
+    # Con escritores concurrentes no se puede perder ninguna visita
+    lost = before + per_process * processes - cms.stats_store.total()
+    summary['errors'] = max(lost, 0)
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """[(escenario, métrica, actual, base)] de lo que empeoró más que la tolerancia."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current['p50_ms'] > base['p50_ms'] * (1 + tolerance):
+            regressions.append((name, 'p50_ms', current['p50_ms'], base['p50_ms']))
+        if current['p99_ms'] > base['p99_ms'] * (1 + 2 * tolerance):
+            regressions.append((name, 'p99_ms', current['p99_ms'], base['p99_ms']))
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append((name, 'rps', current['rps'], base['rps']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de NeoCMS')
+    parser.add_argument('--posts', type=int, default=1000, help='Tamaño del corpus (100 a 50000)')
+    parser.add_argument('--requests', type=int, default=500, help='Peticiones por escenario')
+    parser.add_argument('--processes', type=int, default=min(os.cpu_count() or 1, 4))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='*', help='Escenarios a correr (por defecto todos)')
+    parser.add_argument('--workdir', help='Directorio del corpus (por defecto uno temporal)')
+    parser.add_argument('--json', help='Guardar los resultados en este archivo')
+    parser.add_argument('--baseline', help='Comparar contra esta línea base')
+    parser.add_argument('--save-baseline', help='Guardar los resultados como línea base')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='neocms-bench-')
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    print(f"Generando {args.posts} posts en {workdir}...")
+    prepare(workdir, args.posts, args.seed)
+
+    names = args.only or list(SCENARIOS) + ['log_visit']
+    results = {}
+    print(f"{'escenario':<22}{'peticiones':>11}{'errores':>9}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name in names:
+        if name == 'log_visit':
+            summary = run_log_visit(args.requests * 20, args.processes, args.seed)
+        elif name in SCENARIOS:
+            summary = run_scenario(name, args.requests, args.processes, args.seed)
+        else:
+            print(f"Escenario desconocido: {name}")
+            continue
+        results[name] = summary
+        print(f"{name:<22}{summary['requests']:>11}{summary['errors']:>9}"
+              f"{summary['p50_ms']:>10}{summary['p99_ms']:>10}{summary['rps']:>10}")
+
+    report = {'posts': args.posts, 'processes': args.processes, 'results': results}
+    for path in filter(None, (json_path, save_path)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = any(r['errors'] for r in results.values())
+    if failed:
+        print("Hubo errores en algún escenario")
+    if baseline_path:
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('posts') != args.posts:
+            print(f"La línea base es de {baseline.get('posts')} posts: no se compara")
+        else:
+            regressions = compare(results, baseline['results'], args.tolerance)
+            for name, metric, current, base in regressions:
+                print(f"REGRESIÓN {name}: {metric} {current} (base {base})")
+            failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Escrituras atómicas y lock entre procesos; los usan el CMS y el microservicio de comentarios."""
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path):
+    """Lock exclusivo entre procesos (workers de gunicorn) usando <path>.lock."""
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _tmp_path(path):
+    # Temporal en el mismo directorio (os.replace no cruza sistemas de archivos),
+    # distinto por proceso y por hilo para que dos escritores no se pisen
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def atomic_write_json(path, data, indent=4):
+    """Escribe en un temporal del mismo directorio y lo renombra encima del original."""
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Un archivo montado suelto como volumen de Docker no se puede reemplazar
+        # (EBUSY): lo reescribimos en el lugar, siempre bajo file_lock().
+        os.remove(tmp_path)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=indent)
+
+
+@contextmanager
+def atomic_open(path, durable=True):
+    """
+    Archivo binario para escribir que recién reemplaza a path al cerrarse sin
+    errores: quien lee ve el archivo viejo o el nuevo entero. Con durable=False
+    no se hace fsync (caches que se pueden regenerar).
+    """
+    tmp_path = _tmp_path(path)
+    try:
+        with open(tmp_path, 'wb') as f:
+            yield f
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_bytes(path, data, durable=True):
+    with atomic_open(path, durable=durable) as f:
+        f.write(data)
+
+
+def atomic_write_text(path, text, durable=True):
+    atomic_write_bytes(path, text.encode('utf-8'), durable=durable)
@@ -0,0 +1,256 @@
+"""
+Alta de comentarios en segundo plano.
+
+El POST sólo valida y encola (responde 202); un hilo escritor por proceso
+vacía la cola por lotes: guarda todo el lote en una sola transacción de
+comments.db y manda un único aviso a Telegram por lote.
+
+- Backpressure: la cola tiene tamaño fijo; si está llena, submit() lanza
+  queue.Full y la API responde 503 en vez de acumular memoria.
+- RateLimiter: token bucket por IP para que una ráfaga de spam no llene la
+  cola de todos.
+- Si comments.db falla (ej: "database is locked") el lote se reintenta con
+  espera creciente; si sigue fallando se agrega a comments-pending.jsonl, al
+  lado de comments.db, y se vuelve a intentar más tarde. Un comentario que ya
+  recibió 202 no se pierde.
+
+Con gunicorn cada worker tiene su cola, su escritor y su limitador.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from datetime import datetime
+
+from metrics import pid_alive
+
+TELEGRAM_API = 'https://api.telegram.org/bot{token}/sendMessage'
+TELEGRAM_TIMEOUT = 5
+TELEGRAM_MAX_CHARS = 4000
+SPILL_NAME = 'comments-pending.jsonl'
+RETRY_DELAYS = (0.2, 0.5, 1, 2, 5, 10)  # Esperas entre intentos de guardar un lote
+
+
+class TelegramNotifier:
+    """Avisa al admin de los comentarios nuevos. Sin token/chat no hace nada."""
+
+    def __init__(self, token, chat_id):
+        self.token = token
+        self.chat_id = chat_id
+        self.sent = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return bool(self.token and self.chat_id)
+
+    def message(self, comments):
+        lines = [f"💬 {len(comments)} comentario(s) nuevo(s) pendiente(s) de aprobación"]
+        for c in comments:
+            text = c['text'] if len(c['text']) <= 200 else c['text'][:200] + '…'
+            lines.append(f"\n[{c['slug']}] {c['author']}:\n{text}")
+        return '\n'.join(lines)[:TELEGRAM_MAX_CHARS]
+
+    def notify(self, comments):
+        if not self.enabled or not comments:
+            return
+        body = json.dumps({'chat_id': self.chat_id, 'text': self.message(comments)}).encode('utf-8')
+        req = urllib.request.Request(TELEGRAM_API.format(token=self.token), data=body,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=TELEGRAM_TIMEOUT) as response:
+                response.read()
+            self.sent += 1
+        except Exception as e:
+            # Un aviso perdido no es grave: el comentario ya está guardado
+            self.errors += 1
+            print(f"Error avisando por Telegram: {e}")
+
+
+class CommentWriter:
+    def __init__(self, store, notifier=None, max_queue=1000, batch_size=100, batch_wait=0.2,
+                 spill_path=None):
+        self.store = store
+        self.spill_path = spill_path or os.path.join(store.comments_dir, SPILL_NAME)
+        self.notifier = notifier
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._pid = None
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.failed = 0
+        atexit.register(self.drain)
+
+    def submit(self, slug, author, text):
+        """Encola un comentario; lanza queue.Full si el escritor no da abasto."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((slug, author, text, datetime.now()))
+        except queue.Full:
+            self.rejected += 1
+            raise
+        self.accepted += 1
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_writer(self):
+        # Tras un fork el hilo del padre no existe en el hijo
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='comment-writer', daemon=True).start()
+
+    def _next_batch(self, timeout=None):
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        # Juntamos lo que llegue durante batch_wait para escribir una sola vez
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _store(self, batch, delays=RETRY_DELAYS):
+        """Guarda el lote reintentando; devuelve los comentarios guardados o None si no se pudo."""
+        for attempt in range(len(delays) + 1):
+            try:
+                added = self.store.add_many(batch)
+            except Exception as e:
+                print(f"Error guardando {len(batch)} comentario(s) (intento {attempt + 1}): {e}")
+                if attempt == len(delays):
+                    return None
+                self.retries += 1
+                time.sleep(delays[attempt])
+                continue
+            self.written += len(added)
+            self.batches += 1
+            if self.notifier:
+                self.notifier.notify(added)
+            return added
+
+    def _spill(self, batch):
+        # Una sola escritura en modo append: las líneas de dos workers no se mezclan
+        lines = ''.join(json.dumps([slug, author, text, date.isoformat()]) + '\n'
+                        for slug, author, text, date in batch)
+        try:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self.spilled += len(batch)
+        except OSError as e:
+            self.failed += len(batch)
+            print(f"Error guardando {len(batch)} comentario(s) en {self.spill_path}: {e}")
+
+    def _write(self, batch, delays=RETRY_DELAYS):
+        try:
+            if self._store(batch, delays) is None:
+                self._spill(batch)
+        finally:
+            # Recién ahora: el lote quedó en comments.db o en el archivo de pendientes
+            for _ in batch:
+                self._queue.task_done()
+
+    def _claimed_by_dead_workers(self):
+        # Pendientes que un worker se llevó y no llegó a guardar (murió en el medio)
+        directory, name = os.path.split(self.spill_path)
+        for entry in os.listdir(directory or '.'):
+            pid = entry[len(name) + 1:]
+            if entry.startswith(name + '.') and pid.isdigit() and not pid_alive(int(pid)):
+                yield os.path.join(directory, entry)
+
+    def _replay_file(self, path):
+        # Renombrarlo primero: si varios workers lo intentan, sólo uno se lo lleva
+        claimed = f"{self.spill_path}.{os.getpid()}"
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return 0
+        with open(claimed, 'r', encoding='utf-8') as f:
+            batch = [(slug, author, text, datetime.fromisoformat(date))
+                     for slug, author, text, date in map(json.loads, filter(str.strip, f))]
+        if batch and self._store(batch, delays=()) is None:
+            self._spill(batch)
+        else:
+            self.replayed += len(batch)
+        os.remove(claimed)
+        return len(batch)
+
+    def replay_spilled(self):
+        """Reintenta los comentarios que quedaron en el archivo de pendientes."""
+        return sum(self._replay_file(path) for path in [self.spill_path, *self._claimed_by_dead_workers()])
+
+    def _run(self):
+        last_replay = 0.0
+        while True:
+            batch = self._next_batch(timeout=RETRY_DELAYS[-1])
+            if batch:
+                self._write(batch)
+            if time.monotonic() - last_replay >= RETRY_DELAYS[-1]:
+                last_replay = time.monotonic()
+                try:
+                    self.replay_spilled()
+                except Exception as e:
+                    print(f"Error reintentando comentarios pendientes: {e}")
+
+    def drain(self, timeout=10):
+        """Escribe lo que quede en la cola (al terminar el proceso)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            if self._pid == os.getpid():
+                # El escritor sigue vivo: le damos tiempo a terminar
+                time.sleep(0.05)
+                continue
+            batch = self._next_batch(timeout=0)
+            if not batch:
+                break
+            # Al salir no hay tiempo de esperar: lo que falle queda en el archivo de pendientes
+            self._write(batch, delays=RETRY_DELAYS[:2])
+
+
+class RateLimiter:
+    """Token bucket por clave (IP): 'burst' de golpe y 'rate' por segundo después."""
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # clave -> (tokens, último acceso)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def allow(self, key):
+        """(permitido, segundos hasta el próximo token)."""
+        if self.rate <= 0:
+            return True, 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return True, 0
+        self.limited += 1
+        return False, (1 - tokens) / self.rate
@@ -0,0 +1,323 @@
+"""
+Almacenamiento de comentarios compartido por el CMS (moderación) y el
+microservicio (alta y lectura pública).
+
+Todo vive en un único comments.db (SQLite en modo WAL) dentro del directorio
+de comentarios: insertar es O(1), cada alta/aprobación/borrado es una
+transacción atómica que sólo toca las filas de ese slug, y varios procesos
+pueden escribir a la vez sin perder comentarios.
+
+Los <slug>.json del formato anterior se importan solos la primera vez; para
+forzar la importación a mano:
+
+    python comments_service/comment_store.py migrate comments_data/comments
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+DB_NAME = 'comments.db'
+
+
+def row_to_comment(row):
+    return {
+        "id": row['id'],
+        "author": row['author'],
+        "text": row['text'],
+        "date": row['date'],
+        "approved": bool(row['approved']),
+    }
+
+
+class CommentStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS comments (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            slug TEXT NOT NULL,
+            id REAL NOT NULL,
+            author TEXT NOT NULL,
+            text TEXT NOT NULL,
+            date TEXT NOT NULL,
+            approved INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (slug, id)
+        );
+        CREATE INDEX IF NOT EXISTS comments_by_slug ON comments (slug, approved, seq);
+        -- Cola de moderación: pendientes/aprobados del más nuevo al más viejo
+        CREATE INDEX IF NOT EXISTS comments_by_status ON comments (approved, id);
+        CREATE INDEX IF NOT EXISTS comments_by_id ON comments (id);
+        -- Contadores por slug mantenidos en cada escritura
+        CREATE TABLE IF NOT EXISTS slug_counts (
+            slug TEXT PRIMARY KEY,
+            pending INTEGER NOT NULL DEFAULT 0,
+            approved INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        -- Versión de lo que se ve públicamente de cada slug (ETag del API)
+        CREATE TABLE IF NOT EXISTS slug_versions (slug TEXT PRIMARY KEY, version INTEGER NOT NULL);
+    """
+
+    def __init__(self, comments_dir):
+        self.comments_dir = comments_dir
+        os.makedirs(comments_dir, exist_ok=True)
+        self.path = os.path.join(comments_dir, DB_NAME)
+        self._local = threading.local()
+        # Consultas/transacciones hechas por este proceso, para /metrics
+        self.reads = 0
+        self.writes = 0
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        self._migrate_once()
+        self._build_counts_once()
+        self.epoch = self._epoch()
+
+    def _conn(self):
+        # Una conexión por hilo y por proceso (no se comparten tras un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self):
+        """Transacción de escritura: BEGIN IMMEDIATE toma el lock antes de leer."""
+        self.writes += 1
+        return _Transaction(self._conn())
+
+    def _read(self):
+        self.reads += 1
+        return self._conn()
+
+    # --- Migración desde <slug>.json ---
+
+    def _import_file(self, conn, file_path):
+        slug = os.path.basename(file_path)[:-len('.json')]
+        try:
+            with open(file_path, 'r') as f:
+                comments = json.load(f)
+        except Exception as e:
+            print(f"Error leyendo {file_path}: {e}")
+            return 0
+        conn.executemany(
+            "INSERT OR IGNORE INTO comments (slug, id, author, text, date, approved) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(slug, c['id'], c.get('author', ''), c.get('text', ''), c.get('date', ''),
+              int(bool(c.get('approved')))) for c in comments])
+        return len(comments)
+
+    def migrate_json_dir(self, json_dir=None):
+        json_dir = json_dir or self.comments_dir
+        imported = 0
+        with self._write() as conn:
+            for file_path in sorted(glob.glob(os.path.join(json_dir, '*.json'))):
+                imported += self._import_file(conn, file_path)
+            self._rebuild_counts(conn)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                         (datetime.now().isoformat(),))
+        return imported
+
+    def _migrate_once(self):
+        with self._write() as conn:
+            done = conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone()
+            if done:
+                return
+            for file_path in sorted(glob.glob(os.path.join(self.comments_dir, '*.json'))):
+                self._import_file(conn, file_path)
+            self._rebuild_counts(conn)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)",
+                         (datetime.now().isoformat(),))
+
+    def _rebuild_counts(self, conn):
+        conn.execute("DELETE FROM slug_counts")
+        conn.execute(
+            "INSERT INTO slug_counts (slug, pending, approved) "
+            "SELECT slug, SUM(approved = 0), SUM(approved = 1) FROM comments GROUP BY slug")
+
+    def _build_counts_once(self):
+        # Bases creadas antes de existir slug_counts
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'counts_built'").fetchone():
+                return
+            self._rebuild_counts(conn)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('counts_built', '1')")
+
+    def _count(self, conn, slug, pending=0, approved=0):
+        conn.execute(
+            "INSERT INTO slug_counts (slug, pending, approved) VALUES (?, ?, ?) "
+            "ON CONFLICT(slug) DO UPDATE SET pending = pending + excluded.pending, "
+            "approved = approved + excluded.approved", (slug, pending, approved))
+        conn.execute("DELETE FROM slug_counts WHERE slug = ? AND pending = 0 AND approved = 0", (slug,))
+
+    def _epoch(self):
+        # Identificador de esta base: si se recrea, los ETag viejos dejan de valer
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)",
+                         (uuid.uuid4().hex[:12],))
+            return conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def _bump(self, conn, slug):
+        conn.execute(
+            "INSERT INTO slug_versions (slug, version) VALUES (?, 1) "
+            "ON CONFLICT(slug) DO UPDATE SET version = version + 1", (slug,))
+
+    def version(self, slug):
+        row = self._read().execute("SELECT version FROM slug_versions WHERE slug = ?", (slug,)).fetchone()
+        return row[0] if row else 0
+
+    # --- API ---
+
+    def add(self, slug, author, text):
+        return self.add_many([(slug, author, text, datetime.now())])[0]
+
+    def add_many(self, items):
+        """
+        Inserta [(slug, autor, texto, fecha)] en una sola transacción (lo usa
+        el escritor en segundo plano para guardar los comentarios por lotes).
+        """
+        added = []
+        with self._write() as conn:
+            for slug, author, text, when in items:
+                comment = {
+                    "id": when.timestamp(),
+                    "author": author,
+                    "text": text,
+                    "date": when.strftime('%Y-%m-%d %H:%M'),
+                    "approved": False  # Por defecto, requiere moderación
+                }
+                while True:
+                    try:
+                        conn.execute(
+                            "INSERT INTO comments (slug, id, author, text, date, approved) VALUES (?, ?, ?, ?, ?, 0)",
+                            (slug, comment['id'], author, text, comment['date']))
+                        break
+                    except sqlite3.IntegrityError:
+                        # Dos comentarios del mismo slug en el mismo microsegundo
+                        comment['id'] += 0.000001
+                self._count(conn, slug, pending=1)
+                added.append(dict(comment, slug=slug))
+        return added
+
+    def for_slug(self, slug, approved_only=False):
+        sql = "SELECT * FROM comments WHERE slug = ?"
+        if approved_only:
+            sql += " AND approved = 1"
+        rows = self._read().execute(sql + " ORDER BY seq", (slug,))
+        return [row_to_comment(r) for r in rows]
+
+    def approved_page(self, slug, cursor=0, limit=50):
+        """
+        Comentarios aprobados después de 'cursor' (seq), en orden de llegada.
+        Devuelve (comentarios, siguiente_cursor o None, total_aprobados).
+        """
+        conn = self._read()
+        rows = conn.execute(
+            "SELECT * FROM comments WHERE slug = ? AND approved = 1 AND seq > ? ORDER BY seq LIMIT ?",
+            (slug, cursor, limit + 1)).fetchall()
+        next_cursor = rows[limit - 1]['seq'] if len(rows) > limit else None
+        total = conn.execute("SELECT COUNT(*) FROM comments WHERE slug = ? AND approved = 1",
+                             (slug,)).fetchone()[0]
+        return [row_to_comment(r) for r in rows[:limit]], next_cursor, total
+
+    def moderation_page(self, status='pending', page=1, per_page=50):
+        """Una página de la cola de moderación, los más nuevos primero."""
+        sql = "SELECT * FROM comments"
+        params = []
+        if status in ('pending', 'approved'):
+            sql += " WHERE approved = ?"
+            params.append(1 if status == 'approved' else 0)
+        sql += " ORDER BY id DESC LIMIT ? OFFSET ?"
+        params += [per_page, (page - 1) * per_page]
+
+        comments = []
+        for r in self._read().execute(sql, params):
+            c = row_to_comment(r)
+            c['slug'] = r['slug']
+            comments.append(c)
+        return comments
+
+    def counts(self, top=20):
+        """Totales de pendientes/aprobados y los 'top' slugs con más pendientes."""
+        conn = self._read()
+        pending, approved = conn.execute(
+            "SELECT COALESCE(SUM(pending), 0), COALESCE(SUM(approved), 0) FROM slug_counts").fetchone()
+        per_slug = [dict(r) for r in conn.execute(
+            "SELECT slug, pending, approved FROM slug_counts ORDER BY pending DESC, slug LIMIT ?", (top,))]
+        return {'pending': pending, 'approved': approved, 'per_slug': per_slug}
+
+    def approve(self, slug, comment_id):
+        return self.approve_many([(slug, comment_id)]) > 0
+
+    def delete(self, slug, comment_id):
+        return self.delete_many([(slug, comment_id)]) > 0
+
+    def approve_many(self, items):
+        """Aprueba [(slug, id), ...] en una sola transacción; sólo toca esos slugs."""
+        changed = 0
+        with self._write() as conn:
+            for slug, comment_id in items:
+                cur = conn.execute(
+                    "UPDATE comments SET approved = 1 WHERE slug = ? AND id = ? AND approved = 0",
+                    (slug, comment_id))
+                if cur.rowcount:
+                    self._count(conn, slug, pending=-1, approved=1)
+                    self._bump(conn, slug)
+                    changed += 1
+        return changed
+
+    def delete_many(self, items):
+        changed = 0
+        with self._write() as conn:
+            for slug, comment_id in items:
+                row = conn.execute("SELECT approved FROM comments WHERE slug = ? AND id = ?",
+                                   (slug, comment_id)).fetchone()
+                if row is None:
+                    continue
+                conn.execute("DELETE FROM comments WHERE slug = ? AND id = ?", (slug, comment_id))
+                if row['approved']:
+                    self._count(conn, slug, approved=-1)
+                    # Borrar un pendiente no cambia lo que ve el público
+                    self._bump(conn, slug)
+                else:
+                    self._count(conn, slug, pending=-1)
+                changed += 1
+        return changed
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Almacenamiento de comentarios de NeoCMS')
+    sub = parser.add_subparsers(dest='command', required=True)
+    mig = sub.add_parser('migrate', help='Importa los <slug>.json de un directorio a comments.db')
+    mig.add_argument('comments_dir')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        imported = CommentStore(args.comments_dir).migrate_json_dir()
+        print(f"{imported} comentarios importados a {os.path.join(args.comments_dir, DB_NAME)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,61 +1,161 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
 import json
 import os
-from datetime import datetime
+import queue
+import threading
+from collections import OrderedDict
+from flask import Flask, request, jsonify, Response
+from flask_cors import CORS
+from comment_queue import CommentWriter, RateLimiter, TelegramNotifier
+from comment_store import CommentStore
+from metrics import Metrics, bearer_token_matches
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}}) # Importante para que el CMS pueda consultar la API desde el navegador
 
 COMMENTS_DIR = 'data/comments'
-os.makedirs(COMMENTS_DIR, exist_ok=True)
+store = CommentStore(COMMENTS_DIR)
+
+# /metrics y profiler (X-Profile + "Authorization: Bearer $PROFILE_TOKEN"; sin token, apagado)
+metrics = Metrics(os.environ.get('METRICS_DIR') or None)
+metrics.instrument(app, 'comments',
+                   can_profile=bearer_token_matches(os.environ.get('PROFILE_TOKEN'), allow_if_unset=False),
+                   can_scrape=bearer_token_matches(os.environ.get('METRICS_TOKEN')))
+
+@metrics.collector
+def store_counters():
+    return [
+        ('comments_store_reads_total', 'Consultas a comments.db', {}, store.reads),
+        ('comments_store_writes_total', 'Transacciones de escritura en comments.db', {}, store.writes),
+    ]
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+CACHE_SIZE = 1024
 
-def get_post_file(slug):
-    return os.path.join(COMMENTS_DIR, f"{slug}.json")
+# Cache de respuestas ya serializadas: (slug, cursor, limit) -> (version, cuerpo, cursor, total).
+# La versión del slug viene de comments.db, así que también se invalida cuando
+# el admin aprueba o borra desde el otro proceso.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def get_page(slug, cursor, limit):
+    key = (slug, cursor, limit)
+    version = store.version(slug)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(key)
+            metrics.inc('comments_cache_hits_total', help='Páginas de comentarios servidas desde la cache')
+            return cached
+
+    metrics.inc('comments_cache_misses_total', help='Páginas de comentarios leídas de comments.db')
+    comments, next_cursor, total = store.approved_page(slug, cursor, limit)
+    entry = (version, json.dumps(comments), next_cursor, total)
+    with _cache_lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return entry
 
 @app.route('/comments/<slug>', methods=['GET'])
 def get_comments(slug):
-    file_path = get_post_file(slug)
-    if not os.path.exists(file_path):
-        return jsonify([])
-    
-    with open(file_path, 'r') as f:
-        return jsonify(json.load(f))
+    # Sólo comentarios aprobados; la cola de moderación no sale del servidor
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    version, body, next_cursor, total = get_page(slug, cursor, limit)
+    etag = f"{store.epoch}.{version}.{cursor}.{limit}"
+
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Total-Count'] = str(total)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+MAX_AUTHOR_LENGTH = 80
+MAX_TEXT_LENGTH = 5000
+
+# Las altas se guardan en segundo plano por lotes (ver comment_queue.py)
+notifier = TelegramNotifier(os.environ.get('TELEGRAM_TOKEN'), os.environ.get('TELEGRAM_CHAT_ID'))
+writer = CommentWriter(store, notifier,
+                       max_queue=int(os.environ.get('COMMENT_QUEUE_SIZE', 1000)),
+                       batch_size=int(os.environ.get('COMMENT_BATCH_SIZE', 100)),
+                       batch_wait=float(os.environ.get('COMMENT_BATCH_WAIT', 0.2)))
+# Por IP: COMMENT_RATE_BURST seguidos y después COMMENT_RATE_PER_MINUTE (0 lo desactiva)
+limiter = RateLimiter(float(os.environ.get('COMMENT_RATE_PER_MINUTE', 6)) / 60,
+                      int(os.environ.get('COMMENT_RATE_BURST', 3)))
+# Detrás de un proxy (nginx) la IP real viene en X-Forwarded-For
+TRUST_PROXY = os.environ.get('TRUST_PROXY', '0') == '1'
+
+@metrics.collector
+def writer_counters():
+    return [
+        ('comments_accepted_total', 'Comentarios encolados (202)', {}, writer.accepted),
+        ('comments_rejected_total', 'Comentarios rechazados con la cola llena (503)', {}, writer.rejected),
+        ('comments_rate_limited_total', 'Comentarios rechazados por límite de IP (429)', {}, limiter.limited),
+        ('comments_written_total', 'Comentarios guardados por el escritor', {}, writer.written),
+        ('comments_write_batches_total', 'Lotes escritos en comments.db', {}, writer.batches),
+        ('comments_write_retries_total', 'Reintentos de guardar un lote en comments.db', {}, writer.retries),
+        ('comments_spilled_total', 'Comentarios enviados al archivo de pendientes', {}, writer.spilled),
+        ('comments_replayed_total', 'Comentarios pendientes guardados más tarde', {}, writer.replayed),
+        ('comments_write_failures_total', 'Comentarios que no se pudieron guardar', {}, writer.failed),
+        ('comments_telegram_sent_total', 'Avisos enviados a Telegram', {}, notifier.sent),
+        ('comments_telegram_errors_total', 'Avisos a Telegram fallidos', {}, notifier.errors),
+    ]
+
+def client_ip():
+    if TRUST_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or ''
+
+def error(message, status, retry_after=None):
+    response = jsonify({"error": message})
+    response.status_code = status
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
 
 @app.route('/comments/<slug>', methods=['POST'])
 def add_comment(slug):
-    data = request.json
-    if not data or not data.get('author') or not data.get('text'):
-        return jsonify({"error": "Faltan campos"}), 400
-
-    new_comment = {
-        "id": datetime.now().timestamp(),
-        "author": data['author'],
-        "text": data['text'],
-        "date": datetime.now().strftime('%Y-%m-%d %H:%M'),
-        "approved": False # Por defecto, requiere moderación
-    }
-
-    file_path = get_post_file(slug)
-    comments = []
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            comments = json.load(f)
-    
-    comments.append(new_comment)
-    
-    with open(file_path, 'w') as f:
-        json.dump(comments, f, indent=4)
-
-    return jsonify({"message": "Comentario enviado, pendiente de aprobación"}), 201
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('author') or not data.get('text'):
+        return error("Faltan campos", 400)
+    author, text = data['author'], data['text']
+    if not isinstance(author, str) or not isinstance(text, str):
+        return error("Campos inválidos", 400)
+    author, text = author.strip(), text.strip()
+    if not author or not text:
+        return error("Faltan campos", 400)
+    if len(author) > MAX_AUTHOR_LENGTH or len(text) > MAX_TEXT_LENGTH:
+        return error("Comentario demasiado largo", 400)
+
+    allowed, wait = limiter.allow(client_ip())
+    if not allowed:
+        return error("Demasiados comentarios seguidos, inténtalo más tarde", 429, wait)
+
+    # Se guarda en segundo plano; si la cola está llena, que el cliente reintente
+    try:
+        writer.submit(slug, author, text)
+    except queue.Full:
+        return error("Servicio ocupado, inténtalo de nuevo en unos segundos", 503, 5)
+
+    return jsonify({"message": "Comentario enviado, pendiente de aprobación"}), 202
 
 @app.after_request
 def add_cors_headers(response):
     # Permitir específicamente tu blog
     response.headers['Access-Control-Allow-Origin'] = 'https://tublog.example.com'
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, If-None-Match'
+    response.headers['Access-Control-Expose-Headers'] = 'ETag, X-Next-Cursor, X-Total-Count, Retry-After'
     return response
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Sólo para desarrollo; en producción: gunicorn -c gunicorn.conf.py comments:app
+    app.run(host='0.0.0.0', port=5001, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,41 @@
+"""
+Configuración de gunicorn para el microservicio de comentarios.
+
+    gunicorn -c gunicorn.conf.py comments:app
+
+comments.db (SQLite en modo WAL) ya admite varios procesos escribiendo a la
+vez, así que se puede correr con varios workers.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() + 1, 4)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+max_requests = 5000
+max_requests_jitter = 500
+
+accesslog = '-'
+errorlog = '-'
+
+# Cada worker vuelca sus métricas acá y /metrics devuelve la suma (ver metrics.py)
+os.environ.setdefault('METRICS_DIR', os.path.join('/tmp', 'neocms-comments-metrics'))
+
+
+def on_starting(server):
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def worker_exit(server, worker):
+    # Los comentarios encolados se guardan antes de que el worker termine
+    from comments import metrics, writer
+    writer.drain()
+    metrics.flush()
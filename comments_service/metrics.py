@@ -0,0 +1,290 @@
+"""
+Métricas en formato Prometheus (/metrics) y profiler por petición, sin
+dependencias externas. Lo usan el CMS y el microservicio de comentarios.
+
+- Latencia de cada ruta (histograma) y peticiones por ruta/método/estado.
+- Contadores propios con inc() y contadores que ya llevan otros objetos
+  (parseos de posts, renders, lecturas/escrituras...) con collector().
+- Con gunicorn cada worker tiene sus números: si METRICS_DIR está definido,
+  cada proceso vuelca los suyos a <METRICS_DIR>/<pid>.json y /metrics
+  devuelve la suma de todos.
+- Profiler: con la cabecera "X-Profile: 1" (y permiso, ver instrument())
+  la respuesta se reemplaza por el reporte de cProfile de esa petición.
+"""
+import atexit
+import cProfile
+import fcntl
+import hmac
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+from flask import Response, g, request
+
+from atomic_io import atomic_write_bytes
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_HEADER = 'X-Profile'
+PROFILE_LINES = 60
+DEAD_FILE = 'dead.json'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metrics:
+    def __init__(self, metrics_dir=None, flush_interval=5):
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._meta = {}        # nombre -> (tipo, ayuda)
+        self._counters = {}    # (nombre, labels) -> valor
+        self._histograms = {}  # (nombre, labels) -> [cuentas por bucket..., suma, total]
+        self._buckets = {}     # nombre -> buckets
+        self._collectors = []
+        self._pid = None
+        atexit.register(self.flush)
+
+    # --- Registro ---
+
+    def inc(self, name, value=1, help='', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._meta.setdefault(name, ('counter', help))
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._ensure_flusher()
+
+    def observe(self, name, value, help='', buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._meta.setdefault(name, ('histogram', help))
+            buckets = self._buckets.setdefault(name, buckets)
+            data = self._histograms.get(key)
+            if data is None:
+                data = self._histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+        self._ensure_flusher()
+
+    def collector(self, func):
+        """func() -> [(nombre, ayuda, {labels}, valor)] leídos en cada scrape (contadores)."""
+        self._collectors.append(func)
+        return func
+
+    # --- Snapshot por proceso ---
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(data) for key, data in self._histograms.items()}
+            meta = dict(self._meta)
+            buckets = dict(self._buckets)
+        for func in self._collectors:
+            try:
+                for name, help, labels, value in func():
+                    meta.setdefault(name, ('counter', help))
+                    key = (name, tuple(sorted(labels.items())))
+                    counters[key] = counters.get(key, 0) + value
+            except Exception as e:
+                print(f"Error leyendo métricas: {e}")
+        return {
+            'meta': meta,
+            'buckets': {name: list(b) for name, b in buckets.items()},
+            'counters': [[name, [list(l) for l in labels], value] for (name, labels), value in counters.items()],
+            'histograms': [[name, [list(l) for l in labels], data] for (name, labels), data in histograms.items()],
+        }
+
+    def _ensure_flusher(self):
+        # Tras un fork el hilo del padre no existe en el hijo
+        if self.metrics_dir and self._pid != os.getpid():
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error guardando métricas: {e}")
+
+    def flush(self):
+        if not self.metrics_dir:
+            return
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+        atomic_write_bytes(path, json.dumps(self.snapshot()).encode('utf-8'), durable=False)
+
+    @staticmethod
+    def merge(total, snap):
+        total['meta'].update({k: tuple(v) for k, v in snap['meta'].items()})
+        total['buckets'].update(snap['buckets'])
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(tuple(l) for l in labels))
+            total['counters'][key] = total['counters'].get(key, 0) + value
+        for name, labels, data in snap['histograms']:
+            key = (name, tuple(tuple(l) for l in labels))
+            current = total['histograms'].get(key)
+            total['histograms'][key] = list(data) if current is None else [a + b for a, b in zip(current, data)]
+
+    def _collect_dir(self, total):
+        # Los números de workers ya terminados se acumulan en dead.json para
+        # que los contadores nunca bajen
+        with open(os.path.join(self.metrics_dir, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            dead_path = os.path.join(self.metrics_dir, DEAD_FILE)
+            dead = {'meta': {}, 'buckets': {}, 'counters': {}, 'histograms': {}}
+            try:
+                with open(dead_path, 'r') as f:
+                    self.merge(dead, json.load(f))
+            except (OSError, json.JSONDecodeError):
+                pass
+
+            folded = False
+            for name in os.listdir(self.metrics_dir):
+                if not name.endswith('.json') or name == DEAD_FILE:
+                    continue
+                pid = int(name[:-len('.json')]) if name[:-len('.json')].isdigit() else None
+                if pid is None or pid == os.getpid():
+                    continue
+                path = os.path.join(self.metrics_dir, name)
+                try:
+                    with open(path, 'r') as f:
+                        snap = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+                if pid_alive(pid):
+                    self.merge(total, snap)
+                else:
+                    self.merge(dead, snap)
+                    os.remove(path)
+                    folded = True
+
+            if folded:
+                atomic_write_bytes(dead_path, json.dumps(self._serializable(dead)).encode('utf-8'))
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self.merge(total, self._serializable(dead))
+
+    @staticmethod
+    def _serializable(merged):
+        return {
+            'meta': merged['meta'],
+            'buckets': merged['buckets'],
+            'counters': [[n, [list(l) for l in labels], v] for (n, labels), v in merged['counters'].items()],
+            'histograms': [[n, [list(l) for l in labels], d] for (n, labels), d in merged['histograms'].items()],
+        }
+
+    # --- Exposición ---
+
+    def render(self):
+        """Texto para /metrics (formato de exposición de Prometheus 0.0.4)."""
+        total = {'meta': {}, 'buckets': {}, 'counters': {}, 'histograms': {}}
+        self.merge(total, self.snapshot())
+        if self.metrics_dir and os.path.isdir(self.metrics_dir):
+            self._collect_dir(total)
+
+        lines = []
+        for name in sorted(total['meta']):
+            kind, help = total['meta'][name]
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for (n, labels), value in sorted(total['counters'].items()):
+                    if n == name:
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                continue
+            buckets = total['buckets'][name]
+            for (n, labels), data in sorted(total['histograms'].items()):
+                if n != name:
+                    continue
+                for bound, count in zip(list(buckets) + [float('inf')], data[:len(buckets)] + [data[-1]]):
+                    le = labels + (('le', format_value(float(bound))),)
+                    lines.append(f"{name}_bucket{format_labels(le)} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(float(data[-2]))}")
+                lines.append(f"{name}_count{format_labels(labels)} {data[-1]}")
+        return '\n'.join(lines) + '\n'
+
+    def instrument(self, app, prefix, can_profile=lambda: False, can_scrape=lambda: True):
+        """
+        Mide cada petición de 'app' y agrega la ruta /metrics.
+        can_profile(): si la petición actual puede pedir el profiler (ej: sólo admin).
+        """
+        latency = f"{prefix}_request_duration_seconds"
+        requests_total = f"{prefix}_requests_total"
+
+        @app.before_request
+        def _start_timer():
+            g._metrics_start = time.perf_counter()
+            if request.headers.get(PROFILE_HEADER) and can_profile():
+                g._profiler = cProfile.Profile()
+                g._profiler.enable()
+
+        @app.after_request
+        def _record(response):
+            start = g.pop('_metrics_start', None)
+            endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+            if start is not None:
+                self.observe(latency, time.perf_counter() - start, 'Latencia de cada petición por ruta',
+                             endpoint=endpoint, method=request.method)
+            self.inc(requests_total, 1, 'Peticiones atendidas por ruta y estado',
+                     endpoint=endpoint, method=request.method, status=response.status_code)
+
+            profiler = g.pop('_profiler', None)
+            if profiler is None:
+                return response
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            report = Response(out.getvalue(), mimetype='text/plain')
+            report.headers['X-Profiled-Status'] = str(response.status_code)
+            report.headers['Cache-Control'] = 'no-store'
+            return report
+
+        @app.route('/metrics')
+        def metrics():
+            if not can_scrape():
+                return Response('Forbidden\n', status=403, mimetype='text/plain')
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+        return metrics
+
+
+def bearer_token_matches(expected, allow_if_unset=True):
+    """
+    can_scrape()/can_profile() que exige 'Authorization: Bearer <expected>'.
+    Sin token configurado permite todo (o nada, con allow_if_unset=False).
+    """
+    def check():
+        if not expected:
+            return allow_if_unset
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {expected}")
+    return check
@@ -0,0 +1,87 @@
+"""
+Compresión gzip/brotli de las respuestas dinámicas (HTML, RSS, JSON), para
+no depender de que haya un proxy delante que lo haga.
+
+Sólo se comprime lo que supera min_size. El resultado se guarda en una LRU
+indexada por el ETag de la respuesta (o por el hash del cuerpo si no tiene),
+así que un post ya comprimido no se vuelve a comprimir en cada visita.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/rss+xml', 'application/json', 'text/plain'}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class ResponseCompressor:
+    def __init__(self, min_size=1024, max_entries=256, max_body=2 * 1024 * 1024):
+        self.min_size = min_size
+        self.max_entries = max_entries
+        self.max_body = max_body
+        self._cache = OrderedDict()  # (clave, encoding) -> cuerpo comprimido
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encodings(self):
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def negotiate(self, accept_encodings):
+        for encoding in self.encodings():
+            if accept_encodings[encoding]:
+                return encoding
+        return None
+
+    def _compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=BROTLI_QUALITY)
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+    def compressed(self, data, encoding, key=None):
+        key = (key or hashlib.sha1(data).hexdigest(), encoding)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return body
+        body = self._compress(data, encoding)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = body
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return body
+
+    def apply(self, request, response):
+        """after_request: comprime response si corresponde."""
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if not self.min_size <= len(data) <= self.max_body:
+            return response
+
+        etag, weak = response.get_etag()
+        response.set_data(self.compressed(data, encoding, key=etag and f"{etag}:{len(data)}"))
+        response.headers['Content-Encoding'] = encoding
+        if etag and not weak:
+            # El cuerpo comprimido ya no es byte a byte el del ETag fuerte
+            response.set_etag(etag, weak=True)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._cache)}
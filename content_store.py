@@ -0,0 +1,309 @@
+"""
+Dónde se guardan los posts.
+
+- FileContentStore: un <slug>.md por post en CONTENT_DIR, como siempre, o
+  repartidos en subdirectorios por hash del slug (sharded=True:
+  content/3f/<slug>.md) para que ningún directorio tenga decenas de miles de
+  archivos.
+- SqliteContentStore: todos los posts en un único content.db.
+
+Los tres guardan el archivo completo (frontmatter + Markdown) y cada save()
+es atómico: quien lee ve la versión vieja o la nueva, nunca media. Que un
+post sea borrador lo dice su campo 'status'; los draft_<slug>.md de antes se
+siguen leyendo como borradores.
+
+Importar o exportar un sitio entero (los posts se leen, parsean y validan
+en paralelo con un pool de procesos):
+
+    python content_store.py import viejo/content content/content.db
+    python content_store.py import viejo/content sharded:content
+    python content_store.py export content/content.db /tmp/export
+
+Un destino terminado en .db es SQLite, "sharded:<dir>" es un directorio
+repartido y cualquier otro directorio es el formato plano de siempre.
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+
+import frontmatter
+
+from atomic_io import atomic_write_text
+
+LEGACY_DRAFT_PREFIX = 'draft_'
+STATUSES = ('draft', 'published')
+SHARD_PREFIX = 'sharded:'
+
+
+def shard_of(slug):
+    return hashlib.sha1(slug.encode('utf-8')).hexdigest()[:2]
+
+
+def valid_slug(slug):
+    return bool(slug) and not slug.startswith('.') and not any(c in slug for c in '/\\\0')
+
+
+def post_status(metadata, slug=''):
+    """'draft' o 'published' según el campo status (o el prefijo draft_ de antes)."""
+    if metadata.get('status') == 'draft' or slug.startswith(LEGACY_DRAFT_PREFIX):
+        return 'draft'
+    return 'published'
+
+
+class FileContentStore:
+    def __init__(self, content_dir, sharded=False):
+        self.content_dir = content_dir
+        self.sharded = sharded
+        os.makedirs(content_dir, exist_ok=True)
+
+    def path(self, slug):
+        if self.sharded:
+            return os.path.join(self.content_dir, shard_of(slug), f"{slug}.md")
+        return os.path.join(self.content_dir, f"{slug}.md")
+
+    def _dirs(self):
+        if not self.sharded:
+            return [self.content_dir]
+        with os.scandir(self.content_dir) as it:
+            return [d.path for d in it if d.is_dir() and len(d.name) == 2]
+
+    def scan(self):
+        """[(slug, (mtime_ns, tamaño))] de todos los posts."""
+        found = []
+        for directory in self._dirs():
+            with os.scandir(directory) as it:
+                for dirent in it:
+                    if dirent.name.endswith('.md') and dirent.is_file():
+                        st = dirent.stat()
+                        found.append((dirent.name[:-3], (st.st_mtime_ns, st.st_size)))
+        return found
+
+    def stat(self, slug):
+        try:
+            st = os.stat(self.path(slug))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def read(self, slug):
+        try:
+            with open(self.path(slug), 'r', encoding='utf-8') as f:
+                return f.read()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def save(self, slug, text):
+        if not valid_slug(slug):
+            raise ValueError(f"Slug inválido: {slug!r}")
+        path = self.path(slug)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write_text(path, text)
+
+    def save_many(self, items):
+        for slug, text in items:
+            self.save(slug, text)
+
+    def delete(self, slug):
+        try:
+            os.remove(self.path(slug))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def signature(self):
+        """Cambia cuando cambia cualquier post (lo usa el watcher de gunicorn)."""
+        return frozenset(self.scan())
+
+
+class SqliteContentStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS posts (
+            slug TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL,
+            updated_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS posts_by_status ON posts (status);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        # Una conexión por hilo y por proceso (no se comparten tras un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def scan(self):
+        return [(slug, (updated, size)) for slug, updated, size in
+                self._conn().execute("SELECT slug, updated_ns, size FROM posts")]
+
+    def stat(self, slug):
+        row = self._conn().execute("SELECT updated_ns, size FROM posts WHERE slug = ?", (slug,)).fetchone()
+        return tuple(row) if row else None
+
+    def read(self, slug):
+        row = self._conn().execute("SELECT text FROM posts WHERE slug = ?", (slug,)).fetchone()
+        return row[0] if row else None
+
+    def _save(self, conn, slug, text):
+        if not valid_slug(slug):
+            raise ValueError(f"Slug inválido: {slug!r}")
+        status = post_status(frontmatter.loads(text).metadata, slug)
+        # La versión (updated_ns) siempre avanza, aunque dos guardados caigan en el mismo ns
+        conn.execute(
+            "INSERT INTO posts (slug, text, status, updated_ns, size) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(slug) DO UPDATE SET text = excluded.text, status = excluded.status, "
+            "updated_ns = MAX(excluded.updated_ns, posts.updated_ns + 1), size = excluded.size",
+            (slug, text, status, time.time_ns(), len(text.encode('utf-8'))))
+
+    def save(self, slug, text):
+        self.save_many([(slug, text)])
+
+    def save_many(self, items):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for slug, text in items:
+                self._save(conn, slug, text)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def delete(self, slug):
+        return self._conn().execute("DELETE FROM posts WHERE slug = ?", (slug,)).rowcount > 0
+
+    def signature(self):
+        # Sin abrir la base: con WAL cada escritura cambia content.db-wal
+        stamps = []
+        for path in (self.path, f"{self.path}-wal"):
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+
+def open_store(spec):
+    """'x.db' -> SQLite, 'sharded:<dir>' -> directorio repartido, otro -> directorio plano."""
+    if spec.endswith('.db'):
+        return SqliteContentStore(spec)
+    if spec.startswith(SHARD_PREFIX):
+        return FileContentStore(spec[len(SHARD_PREFIX):], sharded=True)
+    return FileContentStore(spec)
+
+
+def create_content_store(backend, content_dir, db_path):
+    """backend: 'files' (por defecto), 'sharded' o 'sqlite'."""
+    if backend == 'sqlite':
+        return SqliteContentStore(db_path)
+    return FileContentStore(content_dir, sharded=backend == 'sharded')
+
+
+# --- Importación / exportación en paralelo ---
+
+_source = None
+
+
+def _init_worker(spec):
+    global _source
+    _source = open_store(spec)
+
+
+def check_post(slug, text):
+    """
+    Parsea y valida un post. Devuelve (slug, texto, error): un draft_<slug>
+    viejo pasa a <slug> con status: draft.
+    """
+    try:
+        post = frontmatter.loads(text)
+    except Exception as e:
+        return slug, None, f"frontmatter inválido: {' '.join(str(e).split())}"
+    if not str(post.metadata.get('title') or '').strip():
+        return slug, None, "falta el título"
+    status = post.metadata.get('status')
+    if status is not None and status not in STATUSES:
+        return slug, None, f"status desconocido: {status!r}"
+    if slug.startswith(LEGACY_DRAFT_PREFIX):
+        slug = slug[len(LEGACY_DRAFT_PREFIX):]
+        post.metadata['status'] = 'draft'
+        text = frontmatter.dumps(post)
+    if not valid_slug(slug):
+        return slug, None, "slug inválido"
+    return slug, text, None
+
+
+def _check(slug):
+    text = _source.read(slug)
+    if text is None:
+        return slug, None, "desapareció durante la copia"
+    return check_post(slug, text)
+
+
+def copy_posts(src_spec, dst_spec, processes=None, batch_size=500):
+    """Copia todos los posts de src a dst validándolos en paralelo. Devuelve (copiados, [(slug, error)])."""
+    slugs = sorted(slug for slug, _ in open_store(src_spec).scan())
+    dst = open_store(dst_spec)
+    seen = set()
+    errors = []
+    batch = []
+    copied = 0
+    with multiprocessing.get_context('fork').Pool(processes, initializer=_init_worker, initargs=(src_spec,)) as pool:
+        for slug, text, error in pool.imap_unordered(_check, slugs, chunksize=64):
+            if error is None and slug in seen:
+                error = "slug duplicado (hay un <slug>.md y un draft_<slug>.md)"
+            if error is not None:
+                errors.append((slug, error))
+                continue
+            seen.add(slug)
+            batch.append((slug, text))
+            if len(batch) >= batch_size:
+                dst.save_many(batch)
+                copied += len(batch)
+                batch = []
+    if batch:
+        dst.save_many(batch)
+        copied += len(batch)
+    return copied, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa/exporta los posts de NeoCMS')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='Copia los .md de un directorio a un almacén (.db, sharded:<dir> o <dir>)')
+    imp.add_argument('src')
+    imp.add_argument('dst')
+    exp = sub.add_parser('export', help='Copia los posts de un almacén a un directorio de .md')
+    exp.add_argument('src')
+    exp.add_argument('dst')
+    for command in (imp, exp):
+        command.add_argument('--processes', type=int, default=None, help='Procesos (por defecto, uno por CPU)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    copied, errors = copy_posts(args.src, args.dst, processes=args.processes)
+    for slug, error in errors:
+        print(f"  {slug}: {error}")
+    print(f"{copied} posts copiados de {args.src} a {args.dst} en {time.perf_counter() - start:.1f}s"
+          f" ({len(errors)} con errores)")
+    raise SystemExit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+RSS generado con templates/rss.xml y guardado ya renderizado.
+
+El XML sólo se vuelve a armar cuando cambia la versión del índice de posts
+(alta, edición o borrado) o los ajustes del sitio; el resto de los pedidos de
+los lectores de feeds se responden desde memoria, o con un 304 si mandan
+If-None-Match / If-Modified-Since.
+
+Last-Modified (y lastBuildDate) es el momento en que este proceso vio el
+último cambio, no la fecha del post más nuevo: borrar o despublicar un post
+también cambia el feed.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from email.utils import format_datetime
+
+FEED_ITEMS = 20
+
+
+def rfc822_date(value):
+    """'2025-12-01' (o un date del YAML) en el formato que pide RSS, o None."""
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, date):
+        moment = datetime(value.year, value.month, value.day)
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment)
+
+
+class FeedCache:
+    def __init__(self, post_index, max_entries=8):
+        self.post_index = post_index
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._state = None
+        self._changed_at = 0
+
+    def entries(self, limit=FEED_ITEMS):
+        """Los últimos 'limit' posts publicados (sin borradores ni published: false)."""
+        posts = [e for e in self.post_index.published() if e.metadata.get('published', True)]
+        return posts[:limit]
+
+    def _observe(self, state):
+        # Segundos enteros y siempre hacia adelante: dos cambios en el mismo
+        # segundo no pueden dejar el mismo Last-Modified
+        with self._lock:
+            if state != self._state:
+                self._state = state
+                self._changed_at = max(math.ceil(time.time()), self._changed_at + 1)
+
+    def last_modified(self):
+        """Cuándo cambió por última vez el índice o los ajustes, para Last-Modified."""
+        return datetime.fromtimestamp(self._changed_at, tz=timezone.utc)
+
+    def get(self, variant, build, settings_digest=None):
+        """
+        Devuelve (xml, etag, last_modified). 'variant' distingue versiones del
+        mismo feed (ej: contenido completo o no); build() arma el XML.
+        """
+        self.post_index.refresh()
+        state = (self.post_index.version, settings_digest)
+        self._observe(state)
+        key = (state, variant)
+        with self._lock:
+            cached = self._items.get(key)
+            if cached is not None:
+                self._items.move_to_end(key)
+                return cached
+
+        xml = build()
+        cached = (xml, hashlib.sha1(xml.encode('utf-8')).hexdigest(), self.last_modified())
+        with self._lock:
+            self._items[key] = cached
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return cached
@@ -0,0 +1,185 @@
+"""
+Exportación estática de las páginas públicas (home, posts y RSS).
+
+Cada página se renderiza con el propio Flask (test client) y se escribe en
+STATIC_OUTPUT_DIR con un nombre que nginx puede resolver sin llegar a Python:
+
+    /                            -> home/t-/c-/p-.html
+    /?page=2                     -> home/t-/c-/p-2.html
+    /?tag=python&page=2          -> home/t-python/c-/p-2.html
+    /?category=programación      -> home/t-/c-programaci%C3%B3n/p-.html
+    /post/<slug>                 -> post/<slug>.html
+    /tags, /categories           -> tags.html, categories.html
+    /rss.xml                     -> rss.xml
+
+De cada página guardamos una "firma" con todo lo que influye en su HTML
+(posts listados, sus metadatos, la barra lateral...). Al reconstruir sólo se
+vuelven a renderizar las páginas cuya firma cambió, y se borran las que ya
+no existen.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from urllib.parse import quote
+
+from flask import url_for
+
+from atomic_io import atomic_write_bytes, file_lock
+
+MANIFEST_NAME = '.freeze-manifest.json'
+
+# Marca en el environ para que log_visit() no cuente los renders del freeze
+FREEZE_ENVIRON_KEY = 'neocms.freeze'
+
+
+def signature(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def home_path(tag='', category='', page=None):
+    return f"home/t-{quote(tag, safe='')}/c-{quote(category, safe='')}/p-{page or ''}.html"
+
+
+class Freezer:
+    def __init__(self, app, post_index, output_dir, per_page=8, base_url='http://localhost/',
+                 page_settings=None, post_extras=None):
+        self.app = app
+        self.post_index = post_index
+        self.output_dir = output_dir
+        # per_page y base_url pueden ser callables (ajustes que cambian en caliente)
+        self._per_page = per_page
+        self._base_url = base_url
+        # Callable con ajustes globales que cambian el HTML (ej: comentarios on/off)
+        self.page_settings = page_settings or (lambda: None)
+        # Callable(slug) con lo que además cambia el HTML de un post (ej: sus relacionados)
+        self.post_extras = post_extras or (lambda slug: None)
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+        self._thread = None
+
+    @property
+    def per_page(self):
+        return self._per_page() if callable(self._per_page) else self._per_page
+
+    @property
+    def base_url(self):
+        return self._base_url() if callable(self._base_url) else self._base_url
+
+    # --- Qué páginas existen y de qué depende cada una ---
+
+    def _listing_pages(self, sidebar):
+        per_page = self.per_page
+        listings = [('', '')]
+        listings += [(tag, '') for tag in self.post_index.tags()]
+        listings += [('', str(cat).lower()) for cat in self.post_index.categories()]
+
+        for tag, category in listings:
+            posts = self.post_index.filtered(tag, category)
+            pages = max(1, math.ceil(len(posts) / per_page))
+            for page in range(1, pages + 1):
+                chunk = posts[(page - 1) * per_page:page * per_page]
+                sig = signature(sidebar, page < pages, [sorted(e.metadata.items(), key=str) for e in chunk])
+                url = self._home_url(tag, category, page)
+                yield home_path(tag, category, page), url, sig
+                if page == 1:
+                    # Sin ?page= en la URL nginx busca "p-.html"
+                    yield home_path(tag, category), url, sig
+
+    def _home_url(self, tag, category, page):
+        args = {'page': page, 'q': '', 'tag': tag, 'category': category}
+        with self.app.test_request_context(base_url=self.base_url):
+            return url_for('index', **args)
+
+    def pages(self):
+        """[(ruta en disco, URL a renderizar, firma)] de todo el sitio público."""
+        self.post_index.refresh(force=True)
+        settings = self.page_settings()
+        sidebar = (sorted(self.post_index.categories().items(), key=str), self.post_index.tags(), settings)
+
+        pages = list(self._listing_pages(sidebar))
+        for entry in self.post_index.published():
+            sig = signature(entry.digest, sorted(entry.metadata.items(), key=str), settings,
+                            self.post_extras(entry.slug))
+            pages.append((f"post/{entry.slug}.html", f"/post/{quote(entry.slug)}", sig))
+        pages.append(('tags.html', '/tags', signature(self.post_index.tag_counts(), settings)))
+        pages.append(('categories.html', '/categories', signature(sidebar[0], settings)))
+        pages.append(('rss.xml', '/rss.xml', signature(
+            settings, [(e.digest, sorted(e.metadata.items(), key=str)) for e in self.post_index.entries()])))
+        return pages
+
+    # --- Render y escritura ---
+
+    def _render(self, client, url):
+        response = client.get(url, environ_base={FREEZE_ENVIRON_KEY: True})
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} devolvió {response.status_code}")
+        return response.get_data()
+
+    def _write(self, rel_path, body):
+        path = os.path.join(self.output_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Sin fsync: si se pierde, el próximo freeze la vuelve a generar
+        atomic_write_bytes(path, body, durable=False)
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST_NAME), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def sync(self, clean=False):
+        """
+        Renderiza lo que cambió desde el último freeze (todo, con clean=True).
+        Devuelve (páginas escritas, páginas borradas).
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        # Lock entre hilos y entre workers: dos freezes a la vez se pisarían el manifiesto
+        with self._lock, file_lock(manifest_path):
+            old = self._load_manifest()
+            new = {}
+            written = 0
+
+            client = self.app.test_client()
+            rendered = {}
+            for rel_path, url, sig in self.pages():
+                new[rel_path] = sig
+                if not clean and old.get(rel_path) == sig and os.path.exists(os.path.join(self.output_dir, rel_path)):
+                    continue
+                if url not in rendered:
+                    rendered[url] = self._render(client, url)
+                self._write(rel_path, rendered[url])
+                written += 1
+
+            removed = 0
+            for rel_path in set(old) - set(new):
+                try:
+                    os.remove(os.path.join(self.output_dir, rel_path))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+
+            self._write(MANIFEST_NAME, json.dumps(new, indent=1).encode('utf-8'))
+            return written, removed
+
+    # --- Reconstrucción en segundo plano al guardar ---
+
+    def schedule(self):
+        """Pide un sync() en segundo plano; varias peticiones seguidas se agrupan en uno."""
+        self._pending.set()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='freezer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            try:
+                written, removed = self.sync()
+                print(f"Freeze: {written} páginas regeneradas, {removed} borradas")
+            except Exception as e:
+                print(f"Error regenerando el sitio estático: {e}")
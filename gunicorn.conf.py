@@ -0,0 +1,83 @@
+"""
+Configuración de gunicorn para el CMS (ver wsgi.py).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Todo se puede ajustar por entorno: WEB_CONCURRENCY (workers), GUNICORN_THREADS,
+GUNICORN_TIMEOUT y CONTENT_RELOAD_INTERVAL. Los workers ya ven los posts
+nuevos o editados solos (PostIndex vuelve a mirar el almacén de posts cada
+pocos segundos); además, si los posts cambian, el maestro hace un reload
+ordenado (SIGHUP) para que los workers nuevos arranquen con el índice al día.
+"""
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+import time
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Hilos en vez de más procesos: la mayoría de las peticiones son lecturas de
+# caches en memoria y el resto espera disco o SQLite.
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar workers de vez en cuando acota cualquier crecimiento de memoria
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+
+# Cada worker vuelca sus métricas acá y /metrics devuelve la suma (ver comments_service/metrics.py)
+os.environ.setdefault('METRICS_DIR', os.path.join('/tmp', 'neocms-metrics'))
+
+CONTENT_RELOAD_INTERVAL = float(os.environ.get('CONTENT_RELOAD_INTERVAL', 10))
+
+
+def watch_content(server):
+    # Sólo mira stat() (archivos o content.db) y se manda SIGHUP: el refresh
+    # del índice lo hace on_reload() en el hilo principal, que es el que hace fork
+    from app import content_store
+    last = content_store.signature()
+    while True:
+        time.sleep(CONTENT_RELOAD_INTERVAL)
+        current = content_store.signature()
+        if current != last:
+            last = current
+            server.log.info("Los posts cambiaron: reload ordenado de los workers")
+            os.kill(os.getpid(), signal.SIGHUP)
+
+
+def on_starting(server):
+    # Los números de una ejecución anterior no se mezclan con los nuevos
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def when_ready(server):
+    if CONTENT_RELOAD_INTERVAL > 0:
+        threading.Thread(target=watch_content, args=(server,), name='content-watch', daemon=True).start()
+
+
+def on_reload(server):
+    # Con preload la app vive en el maestro: actualizamos su índice antes de
+    # que se creen los workers nuevos. Los posts relacionados no se recalculan
+    # acá (estamos en el manejador de SIGHUP): quedan pendientes y los pone al
+    # día cada worker en segundo plano.
+    if server.cfg.preload_app:
+        from wsgi import warm_up
+        warm_up(rebuild_related=False)
+
+
+def worker_exit(server, worker):
+    # Que no se pierdan las visitas acumuladas en memoria al reciclar un worker
+    from app import metrics, visit_counter
+    visit_counter.flush()
+    metrics.flush()
@@ -0,0 +1,188 @@
+"""
+Cache de respuestas del listado (home, búsquedas, etiquetas, categorías).
+
+La clave es la combinación normalizada de q/tag/category/page más la versión
+del contenido: un contador global que edit_post()/delete_post() incrementan
+y el hash de los archivos de content/ (por si alguien los cambia a mano).
+Cuando la versión cambia, todo lo anterior deja de servirse.
+
+Además del LRU en memoria de cada worker, con PAGE_CACHE_BACKEND=sqlite el
+HTML y el contador se comparten entre workers en PAGE_CACHE_DB.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+PRUNE_EVERY = 100
+
+
+def normalize_args(args):
+    """Sólo los parámetros que cambian el listado, normalizados como los usa index()."""
+    query = ' '.join(args.get('q', '').lower().split())
+    try:
+        page = int(args.get('page', 1))
+    except (TypeError, ValueError):
+        page = 1
+    return (query, args.get('tag', '').lower(), args.get('category', '').lower(), page)
+
+
+class SqlitePageBackend:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            key TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            body BLOB NOT NULL,
+            stored REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS pages_by_stored ON pages (stored);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """
+
+    def __init__(self, path, max_rows=2048):
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._puts = 0
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        # Una conexión por hilo y por proceso (no se comparten tras un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def counter(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def bump(self):
+        conn = self._conn()
+        conn.execute("INSERT INTO meta (key, value) VALUES ('version', 1) "
+                     "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+        # Lo cacheado con versiones anteriores ya no se va a pedir
+        conn.execute("DELETE FROM pages")
+
+    def get(self, key, version):
+        row = self._conn().execute("SELECT body FROM pages WHERE key = ? AND version = ?",
+                                   (key, version)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, version, body):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO pages (key, version, body, stored) VALUES (?, ?, ?, ?)",
+                     (key, version, body, time.time()))
+        self._puts += 1
+        if self._puts % PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM pages WHERE version != ?", (version,))
+            conn.execute("DELETE FROM pages WHERE key IN "
+                         "(SELECT key FROM pages ORDER BY stored DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+
+
+class PageCache:
+    def __init__(self, post_index, max_entries=256, backend=None):
+        self.post_index = post_index
+        self.max_entries = max_entries
+        self.backend = backend
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0       # Sin backend compartido, el contador es de este proceso
+        self._seen_counter = None
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _current_counter(self):
+        if self.backend is None:
+            return self._counter
+        try:
+            return self.backend.counter()
+        except sqlite3.Error as e:
+            print(f"Error leyendo la versión de la cache de páginas: {e}")
+            return self._counter
+
+    def version(self):
+        counter = self._current_counter()
+        if counter != self._seen_counter:
+            # Otro worker guardó un post: no esperamos al próximo rescan del índice
+            self._seen_counter = counter
+            self.post_index.refresh(force=True)
+        else:
+            self.post_index.refresh()
+        return f"{counter}.{self.post_index.fingerprint()}"
+
+    def bump(self):
+        """Invalida todo lo cacheado (lo llaman edit_post()/delete_post())."""
+        self._counter += 1
+        with self._lock:
+            self._items.clear()
+        if self.backend is not None:
+            try:
+                self.backend.bump()
+            except sqlite3.Error as e:
+                print(f"Error invalidando la cache de páginas compartida: {e}")
+
+    def get(self, key, build):
+        """HTML de 'key' para la versión actual; build() lo genera si no está."""
+        version = self.version()
+        full_key = (version, key)
+        with self._lock:
+            body = self._items.get(full_key)
+            if body is not None:
+                self._items.move_to_end(full_key)
+                self.hits += 1
+                return body
+
+        shared_key = repr(key)
+        if self.backend is not None:
+            try:
+                body = self.backend.get(shared_key, version)
+            except sqlite3.Error as e:
+                print(f"Error leyendo la cache de páginas compartida: {e}")
+            if body is not None:
+                body = body.decode('utf-8')
+                self.shared_hits += 1
+                self._store(full_key, body)
+                return body
+
+        self.misses += 1
+        body = build()
+        self._store(full_key, body)
+        if self.backend is not None:
+            try:
+                self.backend.put(shared_key, version, body.encode('utf-8'))
+            except sqlite3.Error as e:
+                print(f"Error guardando en la cache de páginas compartida: {e}")
+        return body
+
+    def _store(self, key, body):
+        with self._lock:
+            self._items[key] = body
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            'entries': len(self._items),
+            'max_entries': self.max_entries,
+            'shared': self.backend is not None,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.hits + self.shared_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+def create_page_cache(post_index, backend, db_path, max_entries=256):
+    """backend: 'memory' (sólo el LRU de cada worker) o 'sqlite' (compartido en db_path)."""
+    if backend == 'sqlite':
+        return PageCache(post_index, max_entries, SqlitePageBackend(db_path))
+    return PageCache(post_index, max_entries)
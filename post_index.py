@@ -0,0 +1,241 @@
+import hashlib
+import os
+import threading
+import time
+
+import frontmatter
+
+from content_store import post_status
+
+# Cada cuántos segundos, como máximo, volvemos a recorrer el almacén buscando
+# posts nuevos o modificados desde fuera del admin (ej: volumen de Docker).
+RESCAN_INTERVAL = float(os.environ.get('POST_INDEX_RESCAN', 2))
+
+WORDS_PER_MINUTE = 200
+
+
+def parse_tags(raw):
+    if not raw:
+        return []
+    return [t.strip().lower() for t in str(raw).split(',')]
+
+
+def sort_key(metadata):
+    return str(metadata.get('date', ''))
+
+
+class PostEntry:
+    """Un post ya parseado: metadatos listos para las plantillas + contenido."""
+
+    __slots__ = ('slug', 'metadata', 'content', 'digest', 'stamp')
+
+    def __init__(self, slug, post, stamp):
+        self.slug = slug
+        self.content = post.content
+        self.digest = hashlib.sha1(post.content.encode('utf-8')).hexdigest()
+        self.stamp = stamp
+
+        metadata = dict(post.metadata)
+        metadata['slug'] = self.slug
+        # Cálculo de tiempo de lectura (200 palabras por minuto)
+        words = len(post.content.split())
+        metadata['read_time'] = max(1, round(words / WORDS_PER_MINUTE))
+        metadata['tags_list'] = parse_tags(metadata.get('tags'))
+        metadata['is_draft'] = post_status(metadata, slug) == 'draft'
+        self.metadata = metadata
+
+    @property
+    def is_draft(self):
+        return self.metadata['is_draft']
+
+    @property
+    def category(self):
+        return self.metadata.get('category', 'Sin Categoría')
+
+
+class PostIndex:
+    """
+    Índice en memoria de los posts de un almacén (ver content_store.py).
+
+    Sólo se vuelve a parsear (frontmatter + YAML) un post cuando cambia su
+    versión (mtime y tamaño, o updated_ns en SQLite); el resto de las
+    peticiones leen las listas ya ordenadas.
+    """
+
+    def __init__(self, store, rescan_interval=RESCAN_INTERVAL):
+        self.store = store
+        self.rescan_interval = rescan_interval
+        self.version = 0
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._last_scan = 0.0
+        self._views = None
+        self._listeners = []
+        self.parses = 0  # Archivos parseados (frontmatter + YAML), para /metrics
+
+    # --- Mantenimiento del índice ---
+
+    def _load(self, slug, stamp):
+        text = self.store.read(slug)
+        if text is None:
+            return None
+        self.parses += 1
+        try:
+            post = frontmatter.loads(text)
+        except Exception as e:
+            print(f"Error parseando {slug}: {e}")
+            return None
+        return PostEntry(slug, post, stamp)
+
+    def subscribe(self, listener):
+        """Registra listener(slug, entry) para cada alta/cambio (entry=None si se borró)."""
+        self._listeners.append(listener)
+
+    def _notify(self, slug, entry):
+        for listener in self._listeners:
+            try:
+                listener(slug, entry)
+            except Exception as e:
+                print(f"Error notificando cambio de {slug}: {e}")
+
+    def _changed(self):
+        self.version += 1
+        self._views = None
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._last_scan and now - self._last_scan < self.rescan_interval:
+            return
+
+        with self._lock:
+            seen = set()
+            changed = False
+            for slug, stamp in self.store.scan():
+                seen.add(slug)
+                entry = self._entries.get(slug)
+                if entry is not None and entry.stamp == stamp:
+                    continue
+                entry = self._load(slug, stamp)
+                if entry is None:
+                    continue
+                self._entries[slug] = entry
+                self._notify(slug, entry)
+                changed = True
+
+            for slug in list(self._entries):
+                if slug not in seen:
+                    del self._entries[slug]
+                    self._notify(slug, None)
+                    changed = True
+
+            if changed:
+                self._changed()
+            self._last_scan = time.monotonic()
+
+    def update(self, slug):
+        """Vuelve a leer un post concreto (lo llama el admin después de guardar)."""
+        with self._lock:
+            stamp = self.store.stat(slug)
+            if stamp is None:
+                self.remove(slug)
+                return None
+            entry = self._entries.get(slug)
+            if entry is None or entry.stamp != stamp:
+                entry = self._load(slug, stamp)
+                if entry is None:
+                    return None
+                self._entries[slug] = entry
+                self._notify(slug, entry)
+                self._changed()
+            return entry
+
+    def remove(self, slug):
+        with self._lock:
+            if self._entries.pop(slug, None) is not None:
+                self._notify(slug, None)
+                self._changed()
+
+    def lookup(self, slug):
+        """Como get(), pero sin tocar el disco: sólo lo que ya está en el índice."""
+        return self._entries.get(slug)
+
+    def get(self, slug):
+        """Devuelve el post (o None) validando que no cambió en el almacén."""
+        return self.update(slug)
+
+    # --- Vistas precalculadas ---
+
+    def _build_views(self):
+        entries = sorted(self._entries.values(), key=lambda e: sort_key(e.metadata), reverse=True)
+        published = [e for e in entries if not e.is_draft]
+
+        # Facetas: etiqueta/categoría -> publicados ya ordenados, así filtrar y
+        # paginar es tomar un slice de una lista hecha
+        by_tag = {}
+        by_category = {}
+        categories_count = {}
+        for e in published:
+            categories_count[e.category] = categories_count.get(e.category, 0) + 1
+            by_category.setdefault(str(e.category).lower(), []).append(e)
+            for tag in dict.fromkeys(e.metadata['tags_list']):
+                if tag:
+                    by_tag.setdefault(tag, []).append(e)
+
+        # Igual en todos los workers que ven el mismo almacén
+        fingerprint = hashlib.sha1(repr(sorted((e.slug, e.stamp) for e in entries)).encode()).hexdigest()
+
+        return {
+            'all': entries,
+            'fingerprint': fingerprint,
+            'published': published,
+            'categories': categories_count,
+            'tags': sorted(by_tag),
+            'tag_counts': {tag: len(posts) for tag, posts in sorted(by_tag.items())},
+            'by_tag': by_tag,
+            'by_category': by_category,
+        }
+
+    def _view(self, name):
+        self.refresh()
+        with self._lock:
+            if self._views is None:
+                self._views = self._build_views()
+            return self._views[name]
+
+    def entries(self):
+        """Todos los posts (borradores incluidos), del más nuevo al más viejo."""
+        return self._view('all')
+
+    def published(self):
+        return self._view('published')
+
+    def filtered(self, tag='', category=''):
+        """Publicados que tienen la etiqueta y/o categoría dadas (en minúsculas)."""
+        if not tag and not category:
+            return self.published()
+        by_tag = self._view('by_tag')
+        by_category = self._view('by_category')
+        if not category:
+            return by_tag.get(tag, [])
+        if not tag:
+            return by_category.get(category, [])
+        # Las dos a la vez: se recorre la faceta más corta
+        with_tag = by_tag.get(tag, [])
+        with_category = by_category.get(category, [])
+        if len(with_tag) <= len(with_category):
+            return [e for e in with_tag if category == str(e.category).lower()]
+        return [e for e in with_category if tag in e.metadata['tags_list']]
+
+    def categories(self):
+        return self._view('categories')
+
+    def tags(self):
+        return self._view('tags')
+
+    def tag_counts(self):
+        """{etiqueta: cantidad de publicados}, en orden alfabético."""
+        return self._view('tag_counts')
+
+    def fingerprint(self):
+        """Hash de (slug, versión) de todos los posts: cambia con cualquier alta/edición/borrado."""
+        return self._view('fingerprint')
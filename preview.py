@@ -0,0 +1,175 @@
+"""
+Preview del editor renderizado por bloques.
+
+El documento se parte en bloques de primer nivel (separados por líneas en
+blanco) que se pueden convertir por separado sin cambiar el resultado: un
+bloque de código con ``` nunca se corta, los ítems de una lista o las líneas
+de una cita separados por líneas en blanco quedan juntos, lo indentado se
+pega al bloque anterior y un bloque de HTML que abre etiquetas sigue hasta
+que las cierra. El HTML de cada bloque se cachea por su hash, así que en cada
+tecla sólo se convierten los bloques que cambiaron.
+
+El resultado es el mismo que render_markdown() (tables/fenced_code/nl2br).
+Si el texto usa links por referencia ([texto][id] + "[id]: url"), que
+dependen de todo el documento, se convierte entero.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+from markdown import Markdown
+from markdown.extensions.fenced_code import FencedBlockPreprocessor
+
+from render_cache import MARKDOWN_EXTENSIONS
+
+LIST_ITEM_RE = re.compile(r'^\s*(?:[*+-]|\d+\.)\s')
+REFERENCE_RE = re.compile(r'^[ ]{0,3}\[[^\]]+\]:', re.MULTILINE)
+# Párrafo testigo que se agrega al final de cada bloque: lo que queda antes de
+# él es exactamente lo que el bloque aporta al documento, con su separador
+SENTINEL = 'neocmsfindebloque'
+SENTINEL_HTML = f'<p>{SENTINEL}</p>'
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                 'param', 'source', 'track', 'wbr'}
+
+
+def block_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class _OpenTags(HTMLParser):
+    """Etiquetas que quedan abiertas al final de un trozo de HTML."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        # Sólo cierra la última abierta; ante la duda el bloque sigue abierto
+        if self.stack and self.stack[-1] == tag:
+            self.stack.pop()
+
+
+def leaves_html_open(text):
+    if text.rfind('<!--') > text.rfind('-->'):
+        return True
+    parser = _OpenTags()
+    parser.feed(text)
+    parser.close()
+    return bool(parser.stack)
+
+
+def _fence_spans(text):
+    # Mismo regex que usa fenced_code: lo que él toma como bloque, acá también
+    return [m.span() for m in FencedBlockPreprocessor.FENCED_BLOCK_RE.finditer(text)]
+
+
+def split_blocks(text):
+    """Lista de bloques de texto que se pueden convertir cada uno por su cuenta."""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    spans = _fence_spans(text)
+    chunks = []    # (inicio, fin) en text de cada grupo de líneas no vacías
+    start = None
+    offset = 0
+    span_index = 0
+
+    def inside_fence(position):
+        nonlocal span_index
+        while span_index < len(spans) and spans[span_index][1] <= position:
+            span_index += 1
+        return span_index < len(spans) and spans[span_index][0] < position
+
+    for line in text.split('\n'):
+        if not line.strip() and not inside_fence(offset):
+            if start is not None:
+                chunks.append((start, offset - 1))
+                start = None
+        elif start is None:
+            start = offset
+        offset += len(line) + 1
+    if start is not None:
+        chunks.append((start, len(text)))
+
+    # Al juntar bloques se toma el texto original entre ellos, con sus líneas en blanco
+    blocks = []
+    html_open = False
+    for start, end in chunks:
+        first = text[start:end].split('\n', 1)[0]
+        if blocks:
+            previous = text[blocks[-1][0]:blocks[-1][1]]
+        if blocks and (
+                html_open
+                or first[:1] in (' ', '\t')
+                or (LIST_ITEM_RE.match(first) and any(LIST_ITEM_RE.match(l) for l in previous.split('\n')))
+                or (first.startswith('>') and previous.startswith('>'))):
+            blocks[-1] = (blocks[-1][0], end)
+        else:
+            blocks.append((start, end))
+        if html_open or '<' in text[start:end]:
+            html_open = leaves_html_open(text[blocks[-1][0]:blocks[-1][1]])
+    return [text[start:end] for start, end in blocks]
+
+
+class BlockRenderer:
+    """LRU de hash del bloque -> HTML, compartida por todas las sesiones del editor."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _convert(self, text):
+        # Una instancia de Markdown por hilo (no es thread-safe) reutilizada
+        md = getattr(self._local, 'md', None)
+        if md is None:
+            md = self._local.md = Markdown(extensions=MARKDOWN_EXTENSIONS)
+        html = md.reset().convert(f"{text}\n\n{SENTINEL}")
+        if html.endswith(SENTINEL_HTML):
+            return html[:-len(SENTINEL_HTML)]
+        # Un bloque de HTML abierto hasta el final se tragó el testigo
+        return md.reset().convert(text) + '\n'
+
+    def _render_block(self, digest, text):
+        with self._lock:
+            html = self._items.get(digest)
+            if html is not None:
+                self._items.move_to_end(digest)
+                self.hits += 1
+                return html
+        html = self._convert(text)
+        with self._lock:
+            self.misses += 1
+            self._items[digest] = html
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return html
+
+    def blocks(self, text):
+        """
+        [(hash, html)] del documento, convirtiendo sólo los bloques nuevos. El
+        HTML de cada bloque incluye su separador: concatenados dan el documento.
+        """
+        if REFERENCE_RE.search(text):
+            pieces = [text]
+        else:
+            pieces = split_blocks(text)
+        result = []
+        for piece in pieces:
+            digest = block_hash(piece)
+            result.append((digest, self._render_block(digest, piece)))
+        return result
+
+    def render(self, text):
+        return ''.join(html for _, html in self.blocks(text)).strip()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._items), 'hits': self.hits, 'misses': self.misses}
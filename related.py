@@ -0,0 +1,327 @@
+"""
+"Posts relacionados" por similitud TF-IDF (coseno) entre todos los posts
+publicados, calculada en un hilo de fondo.
+
+- Cada post se tokeniza una sola vez por versión (título, cuerpo, etiquetas
+  y categoría, con más peso a lo que no es cuerpo) cuando PostIndex avisa que
+  cambió.
+- Los vectores son dispersos (sólo los MAX_TERMS términos de más peso de cada
+  post) y la similitud se acumula recorriendo el índice invertido; si está
+  instalado numpy, el cálculo completo se hace vectorizado.
+- Editar un post no recalcula todo: se rehace su vector y su lista; los que
+  lo tenían en la suya se recalculan, y al resto sólo se le compara con la
+  versión nueva para ver si entra en su top-k. Los pesos de los demás quedan
+  con el IDF de antes, así que cuando se acumulan cambios en más de
+  FULL_REBUILD_RATIO de los posts se recalcula todo de nuevo.
+- El resultado es un dict slug -> top-k slugs: post() sólo hace una búsqueda.
+"""
+import heapq
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+from search_index import tokenize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 4
+CATEGORY_WEIGHT = 2
+MAX_TERMS = 50        # Términos por post que entran en el vector
+MAX_DF_RATIO = 0.5    # Palabras en más de la mitad de los posts no distinguen nada
+MIN_SCORE = 0.05
+FULL_REBUILD_RATIO = 0.1  # Cambios acumulados (fracción de los posts) que fuerzan un cálculo completo
+
+
+def post_terms(entry):
+    """Frecuencias de términos de un post, con las etiquetas como términos propios."""
+    metadata = entry.metadata
+    terms = Counter(t for t in tokenize(entry.content) if len(t) > 2 and not t.isdigit())
+    for t in tokenize(metadata.get('title', '')):
+        if len(t) > 2:
+            terms[t] += TITLE_WEIGHT
+    for tag in metadata.get('tags_list', []):
+        if tag:
+            terms[f"tag:{tag}"] += TAG_WEIGHT
+    terms[f"category:{str(entry.category).lower()}"] += CATEGORY_WEIGHT
+    return terms
+
+
+class RelatedPosts:
+    def __init__(self, post_index, top_k=5, delay=2.0):
+        self.post_index = post_index
+        self.top_k = top_k
+        self.delay = delay
+        self._terms = {}      # slug -> Counter (sólo se rehace cuando cambia el post)
+        self._changed = set() # Slugs que cambiaron desde el último cálculo
+        self._related = {}    # slug -> (slug, ...) de los más parecidos
+        self._near = {}       # slug -> ((slug, similitud), ...), lo mismo con los puntajes
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._dirty.set()     # Hasta el primer cálculo
+        self._pid = None
+        self._held_pid = None
+        self._listeners = []
+        # Estado del último cálculo, sólo lo toca quien tiene _build_lock
+        self._build_lock = threading.Lock()
+        self._df = Counter()
+        self._counted = {}    # slug -> términos que aportó a _df
+        self._vectors = {}    # slug -> [(término, peso)]
+        self._postings = {}   # término -> {slug: peso}
+        self._drift = 0       # Posts actualizados con el IDF viejo desde el último cálculo completo
+        self.version = 0
+        self.builds = 0
+        self.updates = 0
+
+    # --- Cambios en el contenido ---
+
+    def on_post_changed(self, slug, entry):
+        # Listener para PostIndex.subscribe()
+        terms = post_terms(entry) if entry is not None else None
+        with self._lock:
+            if terms is None:
+                self._terms.pop(slug, None)
+            else:
+                self._terms[slug] = terms
+            self._changed.add(slug)
+        self.schedule()
+
+    def subscribe(self, listener):
+        """Registra listener(slugs) con los posts cuya lista de relacionados cambió."""
+        self._listeners.append(listener)
+
+    def _notify(self, slugs):
+        for listener in self._listeners:
+            try:
+                listener(slugs)
+            except Exception as e:
+                print(f"Error notificando posts relacionados: {e}")
+
+    def hold(self):
+        """
+        No arrancar el hilo en este proceso (el maestro de gunicorn): un fork con
+        un lock tomado por ese hilo lo deja tomado para siempre en el worker.
+        Los cambios quedan pendientes y los calcula cada worker.
+        """
+        self._held_pid = os.getpid()
+
+    def schedule(self):
+        """Pide un recálculo; se hace en segundo plano, agrupando cambios seguidos."""
+        self._dirty.set()
+        with self._lock:
+            # Tras un fork el hilo del padre no existe en el hijo
+            if self._pid == os.getpid() or self._held_pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='related-posts', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.delay)
+            try:
+                self.update()
+            except Exception as e:
+                print(f"Error calculando posts relacionados: {e}")
+
+    # --- Cálculo ---
+
+    def _missing_terms(self, slugs):
+        with self._lock:
+            missing = [slug for slug in slugs if slug not in self._terms]
+        for slug in missing:
+            # Posts que ya estaban en el índice antes de suscribirnos
+            entry = self.post_index.lookup(slug)
+            if entry is not None:
+                with self._lock:
+                    self._terms[slug] = post_terms(entry)
+
+    def _vector(self, terms, n_docs):
+        """Vector TF-IDF normalizado y recortado a MAX_TERMS términos, con el _df actual."""
+        max_df = max(2, MAX_DF_RATIO * n_docs)
+        weights = {}
+        for t, tf in terms.items():
+            d = self._df.get(t, 0)
+            if 1 < d <= max_df:
+                weights[t] = (1 + math.log(tf)) * math.log(n_docs / d)
+        top = heapq.nlargest(MAX_TERMS, weights.items(), key=lambda item: item[1])
+        norm = math.sqrt(sum(w * w for _, w in top)) or 1.0
+        return [(t, w / norm) for t, w in top]
+
+    def _neighbours(self, vectors):
+        """Para cada vector, [(índice, similitud)] de los top_k más parecidos."""
+        postings = {}
+        for i, vector in enumerate(vectors):
+            for term, weight in vector:
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(i)
+                postings[term][1].append(weight)
+
+        if np is not None:
+            postings = {t: (np.array(docs), np.array(ws)) for t, (docs, ws) in postings.items()}
+            scores = np.zeros(len(vectors))
+
+        result = []
+        for i, vector in enumerate(vectors):
+            if np is not None:
+                scores[:] = 0.0
+                for term, weight in vector:
+                    docs, ws = postings[term]
+                    scores[docs] += weight * ws
+                scores[i] = 0.0
+                k = min(self.top_k, len(vectors) - 1)
+                if k <= 0:
+                    result.append([])
+                    continue
+                # Todos los empatados con el k-ésimo, para desempatar igual que sin numpy
+                kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+                best = np.flatnonzero(scores >= max(kth, MIN_SCORE))
+                top = sorted(((int(j), float(scores[j])) for j in best), key=lambda item: (-item[1], item[0]))[:k]
+            else:
+                acc = {}
+                for term, weight in vector:
+                    docs, ws = postings[term]
+                    for j, w in zip(docs, ws):
+                        acc[j] = acc.get(j, 0.0) + weight * w
+                acc.pop(i, None)
+                top = heapq.nsmallest(self.top_k, acc.items(), key=lambda item: (-item[1], item[0]))
+            result.append([(j, score) for j, score in top if score >= MIN_SCORE])
+        return result
+
+    def _scores(self, slug):
+        """{slug: similitud} con todos los que comparten algún término (índice invertido guardado)."""
+        acc = {}
+        for term, weight in self._vectors.get(slug, ()):
+            for other, w in self._postings[term].items():
+                acc[other] = acc.get(other, 0.0) + weight * w
+        acc.pop(slug, None)
+        return acc
+
+    def _best(self, scores):
+        top = heapq.nsmallest(self.top_k, scores, key=lambda item: (-item[1], item[0]))
+        return tuple((other, score) for other, score in top if score >= MIN_SCORE)
+
+    def rebuild(self):
+        """Recalcula de una vez los relacionados de todos los publicados."""
+        with self._build_lock:
+            self._dirty.clear()
+            with self._lock:
+                self._changed.clear()
+            # En orden alfabético: los empates se desempatan por slug, igual que en update()
+            slugs = sorted(e.slug for e in self.post_index.published())
+            self._missing_terms(slugs)
+            with self._lock:
+                counts = {slug: self._terms.get(slug) or Counter() for slug in slugs}
+
+            self._df = Counter()
+            for terms in counts.values():
+                self._df.update(terms.keys())
+            self._counted = {slug: frozenset(terms) for slug, terms in counts.items()}
+            self._vectors = {slug: self._vector(counts[slug], len(slugs)) for slug in slugs}
+            self._postings = {}
+            for slug, vector in self._vectors.items():
+                for term, weight in vector:
+                    self._postings.setdefault(term, {})[slug] = weight
+            self._drift = 0
+
+            neighbours = self._neighbours([self._vectors[slug] for slug in slugs])
+            near = {slug: tuple((slugs[j], score) for j, score in top) for slug, top in zip(slugs, neighbours)}
+            related = {slug: tuple(other for other, _ in top) for slug, top in near.items()}
+            with self._lock:
+                changed = {slug for slug in set(self._related) | set(related)
+                           if self._related.get(slug) != related.get(slug)}
+                self._near = near
+                self._related = related
+                self.version += 1
+                self.builds += 1
+        if changed:
+            self._notify(changed)
+        return related
+
+    def update(self):
+        """
+        Aplica los cambios pendientes tocando sólo los posts afectados (o todo,
+        si todavía no hubo un cálculo o se acumularon demasiados cambios).
+        """
+        published = {e.slug for e in self.post_index.published()}
+        with self._build_lock:
+            with self._lock:
+                pending = len(self._changed)
+            if not self.builds or self._drift + pending > FULL_REBUILD_RATIO * max(len(published), 1):
+                full = True
+            else:
+                full = False
+                self._dirty.clear()
+                with self._lock:
+                    changed, self._changed = self._changed, set()
+                self._missing_terms(changed & published)
+                with self._lock:
+                    counts = {slug: self._terms.get(slug) for slug in changed if slug in published}
+
+                # Frecuencias de documento: se quita lo que aportaba cada post y se suma lo nuevo
+                for slug in changed:
+                    old = self._counted.pop(slug, None)
+                    if old:
+                        self._df.subtract(old)
+                    if counts.get(slug):
+                        self._counted[slug] = frozenset(counts[slug])
+                        self._df.update(self._counted[slug])
+
+                for slug in changed:
+                    for term, _ in self._vectors.pop(slug, ()):
+                        self._postings[term].pop(slug, None)
+                    if slug in counts:
+                        vector = self._vector(counts[slug] or Counter(), len(published))
+                        self._vectors[slug] = vector
+                        for term, weight in vector:
+                            self._postings.setdefault(term, {})[slug] = weight
+                self._drift += len(changed)
+
+                # Se recalculan los cambiados y los que tenían alguno en su lista; los
+                # demás sólo pueden ganar a un cambiado, que se compara con su top-k
+                with self._lock:
+                    near = dict(self._near)
+                live = [slug for slug in changed if slug in self._vectors]
+                redo = set(live) | {slug for slug, top in near.items()
+                                    if slug not in changed and any(other in changed for other, _ in top)}
+                for slug in changed:
+                    near.pop(slug, None)
+                updated = {slug: self._best(self._scores(slug).items()) for slug in redo}
+                for slug in live:
+                    for other, score in self._scores(slug).items():
+                        if other in redo or score < MIN_SCORE:
+                            continue
+                        top = updated.get(other, near.get(other, ()))
+                        if len(top) < self.top_k or (-score, slug) < (-top[-1][1], top[-1][0]):
+                            updated[other] = self._best(top + ((slug, score),))
+
+                related = {slug: tuple(other for other, _ in top) for slug, top in updated.items()}
+                with self._lock:
+                    gone = {slug for slug in changed if slug not in self._vectors and slug in self._related}
+                    for slug in gone:
+                        self._near.pop(slug, None)
+                        self._related.pop(slug, None)
+                    notify = gone | {slug for slug, top in related.items() if self._related.get(slug) != top}
+                    self._near.update(updated)
+                    self._related.update(related)
+                    self.version += 1
+                    self.updates += 1
+        if full:
+            return self.rebuild()
+        if notify:
+            self._notify(notify)
+        return related
+
+    # --- Consultas ---
+
+    def get(self, slug):
+        """Slugs relacionados (vacío hasta que termina el primer cálculo)."""
+        if self._dirty.is_set() and self._pid != os.getpid():
+            # Primer get() del worker con cambios pendientes (del maestro o de antes del fork)
+            self.schedule()
+        return self._related.get(slug, ())
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from markdown import markdown
+
+from atomic_io import atomic_write_text
+
+# Mismo pipeline que siempre usó post()
+MARKDOWN_EXTENSIONS = ['tables', 'fenced_code', 'nl2br']
+
+
+def render_markdown(text):
+    return markdown(text, extensions=MARKDOWN_EXTENSIONS)
+
+
+def content_digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    LRU de HTML ya renderizado, con clave (slug, hash del contenido).
+
+    Si se indica spill_dir, cada render también se guarda en disco
+    (<spill_dir>/<slug>/<hash>.html) para sobrevivir a reinicios y a lo que
+    el LRU en memoria vaya descartando.
+    """
+
+    def __init__(self, max_entries=256, spill_dir=None):
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _spill_path(self, slug, digest):
+        return os.path.join(self.spill_dir, slug, f"{digest}.html")
+
+    def _read_spill(self, slug, digest):
+        try:
+            with open(self._spill_path(slug, digest), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_spill(self, slug, digest, html):
+        path = self._spill_path(slug, digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write_text(path, html, durable=False)
+        except OSError as e:
+            print(f"Error guardando cache de render de {slug}: {e}")
+
+    def _store(self, key, html):
+        with self._lock:
+            self._items[key] = html
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def render(self, slug, content, digest=None):
+        digest = digest or content_digest(content)
+        key = (slug, digest)
+
+        with self._lock:
+            html = self._items.get(key)
+            if html is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return html
+
+        if self.spill_dir:
+            html = self._read_spill(slug, digest)
+            if html is not None:
+                self.disk_hits += 1
+                self._store(key, html)
+                return html
+
+        self.misses += 1
+        html = render_markdown(content)
+        self._store(key, html)
+        if self.spill_dir:
+            self._write_spill(slug, digest, html)
+        return html
+
+    def invalidate(self, slug):
+        with self._lock:
+            for key in [k for k in self._items if k[0] == slug]:
+                del self._items[key]
+        if self.spill_dir:
+            shutil.rmtree(os.path.join(self.spill_dir, slug), ignore_errors=True)
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'entries': len(self._items),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
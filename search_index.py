@@ -0,0 +1,137 @@
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Parámetros de BM25 y peso extra de las palabras del título
+K1 = 1.2
+B = 0.75
+TITLE_BOOST = 3.0
+
+
+def fold(text):
+    """Minúsculas y sin tildes: 'Canción' -> 'cancion'."""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(fold(text))
+
+
+class SearchIndex:
+    """
+    Índice invertido (término -> {slug: frecuencia ponderada}) con ranking BM25.
+
+    El título cuenta TITLE_BOOST veces más que el cuerpo. Se actualiza post a
+    post, así que buscar cuesta lo mismo aunque crezca el directorio de contenido.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_len = {}
+        self._total_len = 0.0
+        self._vocab = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    # --- Mantenimiento ---
+
+    def add(self, slug, title, content):
+        title_tf = Counter(tokenize(title or ''))
+        body_tf = Counter(tokenize(content or ''))
+        weights = {term: tf for term, tf in body_tf.items()}
+        for term, tf in title_tf.items():
+            weights[term] = weights.get(term, 0) + tf * TITLE_BOOST
+        length = sum(weights.values())
+
+        with self._lock:
+            self._remove(slug)
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._vocab = None
+                postings[slug] = weight
+            self._doc_terms[slug] = tuple(weights)
+            self._doc_len[slug] = length
+            self._total_len += length
+
+    def remove(self, slug):
+        with self._lock:
+            self._remove(slug)
+
+    def _remove(self, slug):
+        terms = self._doc_terms.pop(slug, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(slug)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[slug]
+            if not postings:
+                del self._postings[term]
+                self._vocab = None
+
+    def on_post_changed(self, slug, entry):
+        # Listener para PostIndex.subscribe()
+        if entry is None:
+            self.remove(slug)
+        else:
+            self.add(slug, entry.metadata.get('title', ''), entry.content)
+
+    # --- Consultas ---
+
+    def _expand(self, term):
+        """Términos del índice para una palabra buscada (exacta o, si no existe, por prefijo)."""
+        if term in self._postings:
+            return [term]
+        if self._vocab is None:
+            self._vocab = sorted(self._postings)
+        start = bisect.bisect_left(self._vocab, term)
+        matches = []
+        for candidate in self._vocab[start:]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, query):
+        """Slugs que contienen todas las palabras de la búsqueda, de mayor a menor relevancia."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for expanded in self._expand(term):
+                    postings = self._postings[expanded]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for slug, tf in postings.items():
+                        norm = K1 * (1 - B + B * self._doc_len[slug] / avg_len)
+                        score = idf * tf * (K1 + 1) / (tf + norm)
+                        term_scores[slug] = max(term_scores.get(slug, 0.0), score)
+
+                # Todas las palabras tienen que aparecer (AND)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {slug: scores[slug] + s for slug, s in term_scores.items() if slug in scores}
+                if not scores:
+                    return []
+
+        return sorted(scores, key=lambda slug: scores[slug], reverse=True)
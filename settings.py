@@ -0,0 +1,140 @@
+"""
+Ajustes del sitio: config.json con valores por defecto tomados del entorno.
+
+El archivo se lee una sola vez y se vuelve a leer sólo si cambió (mtime,
+tamaño o inodo), mirándolo como mucho cada CONFIG_CHECK_INTERVAL segundos:
+en el camino de post() no hay I/O de disco. Como las escrituras son atómicas
+(temporal + rename bajo file_lock), los demás workers ven el cambio en la
+siguiente comprobación.
+
+Prioridad de cada ajuste: config.json > variable de entorno > valor por defecto.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from atomic_io import atomic_write_json, file_lock
+
+CHECK_INTERVAL = float(os.environ.get('CONFIG_CHECK_INTERVAL', 1))
+
+# nombre -> (tipo, valor por defecto, variable de entorno)
+FIELDS = {
+    'comments_enabled': (bool, True, None),
+    'comments_api_url': (str, 'http://localhost:5003', 'COMMENTS_API_URL'),
+    'per_page': (int, 8, 'POSTS_PER_PAGE'),
+    'site_title': (str, 'NeoSite Blog', 'SITE_TITLE'),
+    # Vacío: se usa el host de cada petición
+    'site_url': (str, '', 'SITE_URL'),
+}
+
+
+def coerce(kind, value):
+    if kind is bool:
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on', 'si', 'sí')
+        return bool(value)
+    if kind is int:
+        return int(value)
+    return str(value)
+
+
+class Settings:
+    """Ajustes ya validados; inmutables (un cambio crea otro Settings)."""
+
+    __slots__ = tuple(FIELDS) + ('digest',)
+
+    def __init__(self, raw):
+        for name, (kind, default, env) in FIELDS.items():
+            value = default
+            if env and os.environ.get(env) is not None:
+                value = os.environ[env]
+            if name in raw:
+                value = raw[name]
+            try:
+                value = coerce(kind, value)
+            except (TypeError, ValueError):
+                print(f"Ajuste inválido {name}={value!r}, se usa {default!r}")
+                value = default
+            object.__setattr__(self, name, value)
+        if self.per_page < 1:
+            object.__setattr__(self, 'per_page', FIELDS['per_page'][1])
+        # Igual en todos los workers con la misma configuración (para claves de cache)
+        object.__setattr__(self, 'digest', hashlib.sha1(repr(self.as_dict()).encode()).hexdigest()[:12])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings es de sólo lectura; usar ConfigStore.update()")
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in FIELDS}
+
+
+class ConfigStore:
+    def __init__(self, path, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stamp = None
+        self._checked = 0.0
+        self._settings = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _read_raw(self):
+        try:
+            with open(self.path, 'r') as f:
+                content = f.read().strip()
+        except FileNotFoundError:
+            return {}
+        if not content:  # Si el archivo está vacío
+            return {}
+        try:
+            raw = json.loads(content)
+        except json.JSONDecodeError as e:
+            print(f"Error leyendo {self.path}, se usan los valores por defecto: {e}")
+            return {}
+        return raw if isinstance(raw, dict) else {}
+
+    def get(self):
+        """Los ajustes vigentes; relee config.json sólo si cambió en disco."""
+        now = time.monotonic()
+        if self._loaded and now - self._checked < self.check_interval:
+            return self._settings
+        with self._lock:
+            self._checked = now
+            stamp = self._file_stamp()
+            if not self._loaded or stamp != self._stamp:
+                self._settings = Settings(self._read_raw())
+                self._stamp = stamp
+                self._loaded = True
+            return self._settings
+
+    def update(self, **changes):
+        """Cambia ajustes en config.json (leer y escribir bajo el mismo lock)."""
+        unknown = set(changes) - set(FIELDS)
+        if unknown:
+            raise KeyError(f"Ajustes desconocidos: {', '.join(sorted(unknown))}")
+        with file_lock(self.path):
+            raw = self._read_raw()
+            current = Settings(raw)
+            for name, value in changes.items():
+                raw[name] = value(getattr(current, name)) if callable(value) else value
+            atomic_write_json(self.path, raw)
+            settings = Settings(raw)
+            stamp = self._file_stamp()
+        with self._lock:
+            self._settings = settings
+            self._stamp = stamp
+            self._loaded = True
+            self._checked = time.monotonic()
+        return settings
+
+    def toggle(self, name):
+        return self.update(**{name: lambda current: not current})
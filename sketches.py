@@ -0,0 +1,117 @@
+"""
+Estructuras probabilísticas de tamaño fijo para las estadísticas de visitas.
+
+- HyperLogLog: estima cuántos valores distintos se vieron (visitantes únicos)
+  con 2^p bytes, sea cual sea la cantidad de visitas (~1.04/sqrt(2^p) de error).
+- SpaceSaving: los elementos más frecuentes (referers, user agents) con a lo
+  sumo 'capacity' contadores; cada conteo puede sobrestimar como mucho su
+  'error'.
+
+Las dos se pueden fusionar (merge), así que cada worker arma las suyas en
+memoria y el almacén de estadísticas las suma al volcarlas. to_bytes() las
+pasa a bytes para guardarlas y load() las vuelve a armar.
+"""
+import hashlib
+import json
+import math
+
+HLL_TAG = b'H'
+SPACE_SAVING_TAG = b'S'
+
+
+def hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value):
+        h = hash64(value)
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError(f"No se pueden unir HyperLogLog de precisión {self.p} y {other.p}")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Pocos valores: el conteo lineal es más preciso
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return HLL_TAG + bytes([self.p]) + bytes(self.registers)
+
+
+class SpaceSaving:
+    def __init__(self, capacity=100, counters=None):
+        self.capacity = capacity
+        self.counters = dict(counters or {})  # elemento -> [conteo, error]
+
+    def _min_count(self):
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def add(self, item, count=1):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            return
+        # Lleno: el nuevo reemplaza al menos visto y hereda su conteo como error
+        victim = min(self.counters, key=lambda k: self.counters[k][0])
+        floor = self.counters.pop(victim)[0]
+        self.counters[item] = [floor + count, floor]
+
+    def merge(self, other):
+        # Lo que una de las dos no tiene pudo haber llegado a su mínimo sin verse
+        mine, theirs = self._min_count(), other._min_count()
+        merged = {}
+        for item in set(self.counters) | set(other.counters):
+            a = self.counters.get(item, [mine, mine])
+            b = other.counters.get(item, [theirs, theirs])
+            merged[item] = [a[0] + b[0], a[1] + b[1]]
+        keep = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:max(self.capacity, other.capacity)]
+        self.capacity = max(self.capacity, other.capacity)
+        self.counters = dict(keep)
+        return self
+
+    def top(self, n=10):
+        """[(elemento, conteo, error)] de mayor a menor."""
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+        return [(item, count, error) for item, (count, error) in ranked]
+
+    def to_bytes(self):
+        return SPACE_SAVING_TAG + json.dumps({'capacity': self.capacity, 'counters': self.counters}).encode('utf-8')
+
+
+def load(data):
+    data = bytes(data)
+    if data[:1] == HLL_TAG:
+        return HyperLogLog(data[1], data[2:])
+    if data[:1] == SPACE_SAVING_TAG:
+        raw = json.loads(data[1:].decode('utf-8'))
+        return SpaceSaving(raw['capacity'], raw['counters'])
+    raise ValueError("Sketch desconocido")
+
+
+def estimate(sketch):
+    """Número que se guarda junto al sketch para no recalcularlo al mostrarlo."""
+    return sketch.count() if isinstance(sketch, HyperLogLog) else sum(c for c, _ in sketch.counters.values())
@@ -0,0 +1,277 @@
+"""
+Backends de estadísticas de visitas.
+
+- SqliteStatsStore (por defecto): tablas ya agregadas por día y por post,
+  con índices para "últimos N días" y "top N posts".
+- JsonStatsStore: el stats.json de siempre, por compatibilidad.
+
+Además de los contadores guardan sketches (ver sketches.py) por clave:
+visitantes únicos por día/post/total y los referers y user agents más
+frecuentes. Cada volcado los fusiona con los guardados.
+
+Migrar de uno a otro:
+
+    python stats_store.py migrate stats.json stats.db
+"""
+import argparse
+import base64
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+
+import sketches
+from atomic_io import atomic_write_json, file_lock
+
+
+def empty_stats():
+    return {'daily': {}, 'posts': {}, 'total': 0}
+
+
+def merge_sketch(stored, delta):
+    """Fusiona el sketch de un volcado con el guardado (bytes o None)."""
+    if stored is None:
+        return delta
+    return sketches.load(stored).merge(delta)
+
+
+class JsonStatsStore:
+    def __init__(self, path):
+        self.path = path
+        # Contadores de I/O para /metrics
+        self.reads = 0
+        self.writes = 0
+
+    def load(self):
+        stats = empty_stats()
+        self.reads += 1
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            try:
+                with open(self.path, 'r') as f:
+                    stats = json.load(f)
+            except json.JSONDecodeError:
+                print("Error: stats.json corrupto. Se iniciará uno nuevo pero verifica backups.")
+        # Aseguramos que existan las claves (por si viene de una versión vieja)
+        stats.setdefault('daily', {})
+        stats.setdefault('posts', {})
+        stats.setdefault('total', 0)
+        stats.setdefault('sketches', {})
+        return stats
+
+    def apply(self, deltas):
+        with file_lock(self.path):
+            stats = self.load()
+            stats['total'] += deltas['total']
+            for day, count in deltas['daily'].items():
+                stats['daily'][day] = stats['daily'].get(day, 0) + count
+            for slug, count in deltas['posts'].items():
+                stats['posts'][slug] = stats['posts'].get(slug, 0) + count
+            for key, delta in deltas.get('sketches', {}).items():
+                stored = stats['sketches'].get(key)
+                sketch = merge_sketch(base64.b64decode(stored['data']) if stored else None, delta)
+                stats['sketches'][key] = {'data': base64.b64encode(sketch.to_bytes()).decode('ascii'),
+                                          'estimate': sketches.estimate(sketch)}
+            atomic_write_json(self.path, stats)
+            self.writes += 1
+
+    def total(self):
+        return self.load().get('total', 0)
+
+    def daily(self, since=None):
+        """[(día, visitas)] del más nuevo al más viejo, opcionalmente desde 'since'."""
+        days = self.load()['daily'].items()
+        if since:
+            days = [(d, c) for d, c in days if d >= since]
+        return sorted(days, reverse=True)
+
+    def top_posts(self, limit=None):
+        posts = self.load()['posts'].items()
+        return sorted(posts, key=lambda item: item[1], reverse=True)[:limit]
+
+    def sketch(self, key):
+        stored = self.load()['sketches'].get(key)
+        return sketches.load(base64.b64decode(stored['data'])) if stored else None
+
+    def estimates(self, prefix):
+        """{resto de la clave: estimación} de los sketches cuya clave empieza con prefix."""
+        return {key[len(prefix):]: stored['estimate']
+                for key, stored in self.load()['sketches'].items() if key.startswith(prefix)}
+
+    def snapshot(self):
+        stats = self.load()
+        stats['sketches'] = {key: sketches.load(base64.b64decode(stored['data']))
+                             for key, stored in stats['sketches'].items()}
+        return stats
+
+
+class SqliteStatsStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, visits INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS daily (day TEXT PRIMARY KEY, visits INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS posts (slug TEXT PRIMARY KEY, visits INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS posts_by_visits ON posts (visits DESC);
+        -- Sketches serializados + su estimación ya calculada para mostrarla
+        CREATE TABLE IF NOT EXISTS sketches (key TEXT PRIMARY KEY, data BLOB NOT NULL, estimate INTEGER NOT NULL);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Contadores de I/O para /metrics
+        self.reads = 0
+        self.writes = 0
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        # Una conexión por hilo y por proceso (no se comparten tras un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def apply(self, deltas):
+        self.writes += 1
+        with self._conn() as conn:
+            # Los sketches se leen, fusionan y reescriben: el lock se toma antes de leer
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                "INSERT INTO totals (name, visits) VALUES ('total', ?) "
+                "ON CONFLICT(name) DO UPDATE SET visits = visits + excluded.visits",
+                (deltas['total'],))
+            conn.executemany(
+                "INSERT INTO daily (day, visits) VALUES (?, ?) "
+                "ON CONFLICT(day) DO UPDATE SET visits = visits + excluded.visits",
+                deltas['daily'].items())
+            conn.executemany(
+                "INSERT INTO posts (slug, visits) VALUES (?, ?) "
+                "ON CONFLICT(slug) DO UPDATE SET visits = visits + excluded.visits",
+                deltas['posts'].items())
+            for key, delta in deltas.get('sketches', {}).items():
+                row = conn.execute("SELECT data FROM sketches WHERE key = ?", (key,)).fetchone()
+                sketch = merge_sketch(row[0] if row else None, delta)
+                conn.execute("INSERT OR REPLACE INTO sketches (key, data, estimate) VALUES (?, ?, ?)",
+                             (key, sketch.to_bytes(), sketches.estimate(sketch)))
+
+    def total(self):
+        self.reads += 1
+        row = self._conn().execute("SELECT visits FROM totals WHERE name = 'total'").fetchone()
+        return row[0] if row else 0
+
+    def daily(self, since=None):
+        self.reads += 1
+        if since:
+            cur = self._conn().execute(
+                "SELECT day, visits FROM daily WHERE day >= ? ORDER BY day DESC", (since,))
+        else:
+            cur = self._conn().execute("SELECT day, visits FROM daily ORDER BY day DESC")
+        return cur.fetchall()
+
+    def top_posts(self, limit=None):
+        self.reads += 1
+        return self._conn().execute(
+            "SELECT slug, visits FROM posts ORDER BY visits DESC LIMIT ?",
+            (-1 if limit is None else limit,)).fetchall()
+
+    def sketch(self, key):
+        self.reads += 1
+        row = self._conn().execute("SELECT data FROM sketches WHERE key = ?", (key,)).fetchone()
+        return sketches.load(row[0]) if row else None
+
+    def estimates(self, prefix):
+        """{resto de la clave: estimación} de los sketches cuya clave empieza con prefix."""
+        self.reads += 1
+        cur = self._conn().execute(
+            "SELECT key, estimate FROM sketches WHERE key >= ? AND key < ?", (prefix, prefix + '\uffff'))
+        return {key[len(prefix):]: estimate for key, estimate in cur}
+
+    def is_empty(self):
+        return self._conn().execute("SELECT 1 FROM totals LIMIT 1").fetchone() is None
+
+    def snapshot(self):
+        conn = self._conn()
+        return {
+            'daily': dict(conn.execute("SELECT day, visits FROM daily ORDER BY day")),
+            'posts': dict(conn.execute("SELECT slug, visits FROM posts ORDER BY slug")),
+            'total': self.total(),
+            'sketches': {key: sketches.load(data) for key, data in conn.execute("SELECT key, data FROM sketches")},
+        }
+
+
+def open_store(path):
+    if path.endswith('.json'):
+        return JsonStatsStore(path)
+    return SqliteStatsStore(path)
+
+
+def migrate(src, dst):
+    """Suma todo el contenido de src en dst (pensado para un dst vacío)."""
+    open_store(dst).apply(open_store(src).snapshot())
+
+
+def create_store(backend, json_path, db_path):
+    if backend == 'json':
+        return JsonStatsStore(json_path)
+    store = SqliteStatsStore(db_path)
+    # Primer arranque con SQLite: importamos el historial del stats.json existente
+    # (bajo lock, para que varios workers arrancando a la vez no lo importen dos veces)
+    with file_lock(db_path):
+        if store.is_empty() and os.path.exists(json_path):
+            print(f"Migrando {json_path} a {db_path}...")
+            store.apply(JsonStatsStore(json_path).snapshot())
+    return store
+
+
+def iter_export(store, fmt='json'):
+    """Genera la exportación a trozos, sin armar todo el archivo en memoria."""
+    if fmt == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+
+        def flush():
+            data = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            return data
+
+        writer.writerow(['tipo', 'clave', 'visitas'])
+        writer.writerow(['total', '', store.total()])
+        yield flush()
+        for day, count in store.daily():
+            writer.writerow(['dia', day, count])
+            yield flush()
+        for slug, count in store.top_posts():
+            writer.writerow(['post', slug, count])
+            yield flush()
+        return
+
+    yield '{\n    "daily": {'
+    for i, (day, count) in enumerate(store.daily()):
+        yield f'{"," if i else ""}\n        {json.dumps(day)}: {count}'
+    yield '\n    },\n    "posts": {'
+    for i, (slug, count) in enumerate(store.top_posts()):
+        yield f'{"," if i else ""}\n        {json.dumps(slug)}: {count}'
+    yield f'\n    }},\n    "total": {store.total()}\n}}\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Herramientas de estadísticas de NeoCMS')
+    sub = parser.add_subparsers(dest='command', required=True)
+    mig = sub.add_parser('migrate', help='Copia las estadísticas de un backend a otro (.json o .db)')
+    mig.add_argument('src')
+    mig.add_argument('dst')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate(args.src, args.dst)
+        print(f"Estadísticas copiadas de {args.src} a {args.dst}")
+
+
+if __name__ == '__main__':
+    main()
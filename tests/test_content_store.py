@@ -0,0 +1,128 @@
+import os
+import sys
+
+import frontmatter
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_store import FileContentStore, SqliteContentStore, check_post, copy_posts, open_store, post_status  # noqa: E402
+
+POST = "---\ntitle: Hola\nstatus: published\n---\n\nPrimer párrafo."
+
+
+@pytest.fixture(params=['files', 'sharded', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SqliteContentStore(str(tmp_path / 'content.db'))
+    return FileContentStore(str(tmp_path / 'content'), sharded=request.param == 'sharded')
+
+
+def test_round_trip(store):
+    assert store.read('hola') is None
+    assert store.stat('hola') is None
+    store.save('hola', POST)
+    assert store.read('hola') == POST
+    assert [slug for slug, _ in store.scan()] == ['hola']
+    assert store.stat('hola') == dict(store.scan())['hola']
+
+
+def test_save_changes_stamp_and_signature(store):
+    store.save('hola', POST)
+    stamp, signature = store.stat('hola'), store.signature()
+    store.save('hola', POST + "\n\nSegundo párrafo.")
+    assert store.stat('hola') != stamp
+    assert store.signature() != signature
+
+
+def test_delete(store):
+    store.save('hola', POST)
+    assert store.delete('hola')
+    assert not store.delete('hola')
+    assert store.read('hola') is None
+    assert store.scan() == []
+
+
+def test_save_many(store):
+    store.save_many([(f"post-{i}", POST) for i in range(20)])
+    assert len(store.scan()) == 20
+
+
+@pytest.mark.parametrize('slug', ['', '.oculto', 'a/b', 'a\\b'])
+def test_rejects_invalid_slugs(store, slug):
+    with pytest.raises(ValueError):
+        store.save(slug, POST)
+
+
+def test_sharded_layout(tmp_path):
+    store = FileContentStore(str(tmp_path), sharded=True)
+    store.save('hola', POST)
+    shard = os.path.basename(os.path.dirname(store.path('hola')))
+    assert len(shard) == 2
+    assert (tmp_path / shard / 'hola.md').exists()
+
+
+def test_sqlite_indexes_status(tmp_path):
+    store = SqliteContentStore(str(tmp_path / 'content.db'))
+    store.save('borrador', "---\ntitle: B\nstatus: draft\n---\n\nx")
+    store.save('publicado', POST)
+    rows = dict(store._conn().execute("SELECT slug, status FROM posts"))
+    assert rows == {'borrador': 'draft', 'publicado': 'published'}
+
+
+def test_post_status():
+    assert post_status({'status': 'draft'}) == 'draft'
+    assert post_status({'status': 'published'}) == 'published'
+    assert post_status({}) == 'published'
+    assert post_status({}, 'draft_viejo') == 'draft'
+
+
+def test_check_post_migrates_legacy_drafts():
+    slug, text, error = check_post('draft_viejo', "---\ntitle: Viejo\n---\n\nx")
+    assert error is None
+    assert slug == 'viejo'
+    assert frontmatter.loads(text).metadata['status'] == 'draft'
+
+
+@pytest.mark.parametrize('text, error', [
+    ("---\ntitle: [sin cerrar\n---\n\nx", 'frontmatter inválido'),
+    ("---\nautor: alguien\n---\n\nx", 'falta el título'),
+    ("---\ntitle: T\nstatus: quizás\n---\n\nx", 'status desconocido'),
+])
+def test_check_post_reports_errors(text, error):
+    assert check_post('malo', text)[2].startswith(error)
+
+
+@pytest.mark.parametrize('prefix, name', [('', 'content.db'), ('sharded:', 'out'), ('', 'out')])
+def test_import_and_export(tmp_path, prefix, name):
+    src = FileContentStore(str(tmp_path / 'src'))
+    src.save('hola', POST)
+    src.save('draft_viejo', "---\ntitle: Viejo\n---\n\nx")
+    src.save('sin-titulo', "---\nautor: alguien\n---\n\nx")
+    dst = f"{prefix}{tmp_path / name}"
+
+    copied, errors = copy_posts(str(tmp_path / 'src'), dst, processes=2)
+    assert copied == 2
+    assert [slug for slug, _ in errors] == ['sin-titulo']
+    imported = open_store(dst)
+    assert sorted(slug for slug, _ in imported.scan()) == ['hola', 'viejo']
+    assert post_status(frontmatter.loads(imported.read('viejo')).metadata) == 'draft'
+
+    # Y de vuelta a un directorio plano
+    copied, errors = copy_posts(dst, str(tmp_path / 'export'), processes=2)
+    assert (copied, errors) == (2, [])
+    assert FileContentStore(str(tmp_path / 'export')).read('hola') == POST
+
+
+def test_import_reports_duplicate_slugs(tmp_path):
+    src = FileContentStore(str(tmp_path / 'src'))
+    src.save('hola', POST)
+    src.save('draft_hola', "---\ntitle: Hola (borrador)\n---\n\nx")
+
+    copied, errors = copy_posts(str(tmp_path / 'src'), str(tmp_path / 'content.db'), processes=2)
+    assert copied == 1
+    assert len(errors) == 1
+    slug, error = errors[0]
+    assert slug == 'hola'
+    assert 'duplicado' in error
+    assert len(open_store(str(tmp_path / 'content.db')).scan()) == 1
@@ -0,0 +1,51 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def cms(tmp_path_factory):
+    # Todo lo que escribe la app (posts, estadísticas, comentarios, config.json,
+    # .gz de static/) queda en un directorio temporal, nada del sitio real
+    tmp = tmp_path_factory.mktemp('cms')
+    shutil.copytree(os.path.join(ROOT, 'static'), tmp / 'static', ignore=shutil.ignore_patterns('uploads', '*.gz', '*.br'))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp)
+        for name, value in {
+            'CONTENT_BACKEND': 'sqlite',
+            'CONTENT_DB': str(tmp / 'content.db'),
+            'STATS_DB': str(tmp / 'stats.db'),
+            'STATS_FILE': str(tmp / 'stats.json'),
+            'COMMENTS_DATA_DIR': str(tmp / 'comments_data'),
+            'CONFIG_FILE': str(tmp / 'config.json'),
+            'STATIC_DIR': str(tmp / 'static'),
+            'BACKUP_STATE_DIR': str(tmp / 'backups'),
+            'STATIC_OUTPUT_DIR': str(tmp / '_site'),
+            'METRICS_DIR': '',
+            'POST_INDEX_RESCAN': '0',
+        }.items():
+            mp.setenv(name, value)
+        mp.syspath_prepend(ROOT)
+        import app
+        app.content_store.save('borrador', "---\ntitle: Borrador\nstatus: draft\n---\n\nTodavía no.")
+        app.content_store.save('publicado', "---\ntitle: Publicado\nstatus: published\n---\n\nYa está.")
+        yield app
+
+
+def test_draft_is_hidden_from_visitors(cms):
+    client = cms.app.test_client()
+    assert client.get('/post/publicado').status_code == 200
+    assert client.get('/post/borrador').status_code == 404
+
+
+def test_draft_is_visible_to_admin_and_not_cached(cms):
+    client = cms.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    response = client.get('/post/borrador')
+    assert response.status_code == 200
+    assert response.cache_control.no_store
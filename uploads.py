@@ -0,0 +1,177 @@
+"""
+Subidas del editor guardadas por contenido (content-addressed):
+
+    static/uploads/<2 primeros del hash>/<sha256>.<ext>
+
+El archivo se escribe a disco por trozos calculando el sha256 al vuelo; si ya
+existía uno igual, se descarta el nuevo y se reutiliza el existente. Para
+imágenes PNG/JPG un hilo de fondo genera versiones más chicas
+(<sha256>-<ancho>w.<ext>) sin demorar la subida. El srcset que recibe el
+editor sólo lista las que ya están en disco (en una subida nueva, ninguna:
+sólo el original), así que nunca apunta a un archivo que no existe.
+Las variantes que falten (por ejemplo si el worker se reinició con trabajos
+en cola) se pueden generar offline con:
+
+    flask --app app build-variants
+"""
+import hashlib
+import os
+import queue
+import re
+import tempfile
+import threading
+
+from atomic_io import atomic_open
+
+try:
+    from PIL import Image
+except ImportError:  # Sin Pillow no hay variantes, pero las subidas funcionan igual
+    Image = None
+
+CHUNK_SIZE = 64 * 1024
+VARIANT_WIDTHS = (480, 960, 1600)
+RESIZABLE_EXTENSIONS = {'png', 'jpg'}
+JPEG_QUALITY = 82
+
+
+def normalize_extension(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return 'jpg' if ext == 'jpeg' else ext
+
+
+def upload_name_re(extensions):
+    """Nombres <sha256>.<ext> de subidas con alguna de esas extensiones (jpeg se guarda como jpg)."""
+    exts = sorted({normalize_extension(f".{ext}") for ext in extensions})
+    return re.compile(r'^([0-9a-f]{64})\.(%s)$' % '|'.join(map(re.escape, exts)))
+
+
+ORIGINAL_RE = upload_name_re(RESIZABLE_EXTENSIONS)
+
+
+class UploadStore:
+    def __init__(self, upload_dir, url_prefix='/static/uploads'):
+        self.upload_dir = upload_dir
+        self.url_prefix = url_prefix.rstrip('/')
+        self._jobs = queue.Queue()
+        self._pid = None
+
+    # --- Rutas ---
+
+    def _rel_path(self, digest, ext, width=None):
+        suffix = f"-{width}w" if width else ''
+        return f"{digest[:2]}/{digest}{suffix}.{ext}"
+
+    def url(self, rel_path):
+        return f"{self.url_prefix}/{rel_path}"
+
+    # --- Guardado ---
+
+    def save(self, file_storage, filename):
+        """Guarda la subida y devuelve {'url', 'sha256', 'deduplicated'[, 'srcset', 'width']}."""
+        ext = normalize_extension(filename)
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            digest = digest.hexdigest()
+            rel_path = self._rel_path(digest, ext)
+            path = os.path.join(self.upload_dir, rel_path)
+            deduplicated = os.path.exists(path)
+            if deduplicated:
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        info = {'url': self.url(rel_path), 'sha256': digest, 'deduplicated': deduplicated}
+        if ext in RESIZABLE_EXTENSIONS and Image is not None:
+            info.update(self._variants(path, digest, ext))
+        return info
+
+    # --- Variantes ---
+
+    def _image_width(self, path):
+        try:
+            with Image.open(path) as img:
+                return img.size[0]
+        except Exception as e:
+            print(f"No se pudo leer la imagen {path}: {e}")
+            return None
+
+    def _variants(self, path, digest, ext):
+        width = self._image_width(path)
+        if not width:
+            return {}
+        widths = [w for w in VARIANT_WIDTHS if w < width]
+        existing = [w for w in widths if os.path.exists(os.path.join(self.upload_dir, self._rel_path(digest, ext, w)))]
+        if len(existing) < len(widths):
+            self._enqueue(path, digest, ext, widths)
+        if not existing:
+            return {'width': width}
+        srcset = [f"{self.url(self._rel_path(digest, ext, w))} {w}w" for w in existing]
+        srcset.append(f"{self.url(self._rel_path(digest, ext))} {width}w")
+        return {'width': width, 'srcset': ', '.join(srcset)}
+
+    def _enqueue(self, path, digest, ext, widths):
+        # Tras un fork el hilo del padre no existe en el hijo
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._jobs = queue.Queue()
+            threading.Thread(target=self._run, name='upload-variants', daemon=True).start()
+        self._jobs.put((path, digest, ext, widths))
+
+    def _run(self):
+        while True:
+            path, digest, ext, widths = self._jobs.get()
+            try:
+                self.build_variants(path, digest, ext, widths)
+            except Exception as e:
+                print(f"Error generando variantes de {path}: {e}")
+            finally:
+                self._jobs.task_done()
+
+    def build_variants(self, path, digest, ext, widths=VARIANT_WIDTHS):
+        """Genera (si faltan) las versiones redimensionadas de una imagen. Devuelve cuántas creó."""
+        created = 0
+        with Image.open(path) as original:
+            # Las paletas (PNG de 8 bits) no se pueden remuestrear con LANCZOS
+            img = original.convert('RGBA') if original.mode == 'P' else original
+            for width in widths:
+                if width >= img.size[0]:
+                    continue
+                target = os.path.join(self.upload_dir, self._rel_path(digest, ext, width))
+                if os.path.exists(target):
+                    continue
+                height = max(1, round(img.size[1] * width / img.size[0]))
+                resized = img.resize((width, height), Image.LANCZOS)
+                with atomic_open(target) as f:
+                    if ext == 'jpg':
+                        resized.convert('RGB').save(f, 'JPEG', quality=JPEG_QUALITY,
+                                                    optimize=True, progressive=True)
+                    else:
+                        resized.save(f, 'PNG', optimize=True)
+                created += 1
+        return created
+
+    def build_all_variants(self):
+        """Recorre las subidas por contenido y genera las variantes que falten."""
+        if Image is None:
+            raise RuntimeError("Pillow no está instalado: pip install Pillow")
+        created = 0
+        for root, _, names in os.walk(self.upload_dir):
+            for name in names:
+                match = ORIGINAL_RE.match(name)
+                if match:
+                    created += self.build_variants(os.path.join(root, name), match.group(1), match.group(2))
+        return created
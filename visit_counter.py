@@ -0,0 +1,118 @@
+import atexit
+import os
+import threading
+import time
+
+from sketches import HyperLogLog, SpaceSaving
+
+# Umbrales de volcado al backend de estadísticas: lo que ocurra primero
+FLUSH_INTERVAL = float(os.environ.get('STATS_FLUSH_INTERVAL', 10))
+FLUSH_EVERY = int(os.environ.get('STATS_FLUSH_EVERY', 500))
+
+# Precisión de los HyperLogLog (2^p bytes cada uno) y contadores de los top
+UNIQUES_TOTAL_PRECISION = 14
+UNIQUES_DAY_PRECISION = 12
+UNIQUES_POST_PRECISION = 10
+TOP_CAPACITY = 200
+
+
+class VisitCounter:
+    """
+    Acumula visitas en memoria y vuelca sólo los incrementos al stats store.
+
+    Una visita nunca toca el disco: un hilo de fondo vuelca cada FLUSH_INTERVAL
+    segundos o cuando hay FLUSH_EVERY visitas pendientes. Los backends suman
+    los deltas de forma atómica, así varios workers no se pisan los contadores.
+
+    Los visitantes únicos y los referers/user agents se acumulan igual, en
+    sketches de tamaño fijo (sketches.py) que el backend fusiona con los suyos.
+    """
+
+    def __init__(self, store, flush_interval=FLUSH_INTERVAL, flush_every=FLUSH_EVERY):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reset()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._total = 0
+        self._daily = {}
+        self._posts = {}
+        self._sketches = {}
+
+    def _sketch(self, key, factory):
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = factory()
+        return sketch
+
+    def _ensure_worker(self):
+        # Tras un fork (gunicorn --preload) el hilo del padre no existe en el hijo
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='visit-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def hit(self, path='home', day=None, visitor=None, referrer=None, user_agent=None):
+        """visitor: identificador opaco del visitante (para contar únicos)."""
+        day = day or time.strftime('%Y-%m-%d')
+        with self._lock:
+            self._total += 1
+            self._daily[day] = self._daily.get(day, 0) + 1
+            if path != 'home':
+                self._posts[path] = self._posts.get(path, 0) + 1
+            if visitor:
+                self._sketch('uniques:total', lambda: HyperLogLog(UNIQUES_TOTAL_PRECISION)).add(visitor)
+                self._sketch(f'uniques:day:{day}', lambda: HyperLogLog(UNIQUES_DAY_PRECISION)).add(visitor)
+                if path != 'home':
+                    self._sketch(f'uniques:post:{path}', lambda: HyperLogLog(UNIQUES_POST_PRECISION)).add(visitor)
+            if referrer:
+                self._sketch('top:referrers', lambda: SpaceSaving(TOP_CAPACITY)).add(referrer)
+            if user_agent:
+                self._sketch('top:user_agents', lambda: SpaceSaving(TOP_CAPACITY)).add(user_agent)
+            pending = self._total
+        self._ensure_worker()
+        if pending >= self.flush_every:
+            self._wakeup.set()
+
+    def _take(self):
+        with self._lock:
+            deltas = {'total': self._total, 'daily': self._daily, 'posts': self._posts,
+                      'sketches': self._sketches}
+            self._reset()
+        return deltas
+
+    def _restore(self, deltas):
+        # Si el volcado falló devolvemos los incrementos para el próximo intento
+        with self._lock:
+            self._total += deltas['total']
+            for day, count in deltas['daily'].items():
+                self._daily[day] = self._daily.get(day, 0) + count
+            for slug, count in deltas['posts'].items():
+                self._posts[slug] = self._posts.get(slug, 0) + count
+            for key, sketch in deltas['sketches'].items():
+                current = self._sketches.get(key)
+                self._sketches[key] = sketch if current is None else current.merge(sketch)
+
+    def flush(self):
+        with self._flush_lock:
+            deltas = self._take()
+            if not deltas['total']:
+                return
+            try:
+                self.store.apply(deltas)
+            except Exception as e:
+                print(f"Error guardando estadísticas: {e}")
+                self._restore(deltas)
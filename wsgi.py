@@ -0,0 +1,20 @@
+"""
+Punto de entrada de producción: gunicorn -c gunicorn.conf.py wsgi:app
+
+Con preload_app el proceso maestro importa la app una sola vez y deja el
+índice de posts (y el de búsqueda y los posts relacionados) ya armados antes
+de crear los workers, que los heredan sin volver a parsear content/.
+"""
+from app import app, post_index, related_posts
+
+
+def warm_up(rebuild_related=True):
+    # En el maestro no se arrancan hilos (ver RelatedPosts.hold)
+    related_posts.hold()
+    post_index.refresh(force=True)
+    post_index.published()
+    if rebuild_related:
+        related_posts.rebuild()
+
+
+warm_up()